@@ -0,0 +1,165 @@
+"""
+Asset statici: URL con hash dal manifest di build e handler /static con varianti precompresse.
+
+`python build_assets.py` scrive in app/static/dist i file con il nome che contiene l'hash del
+contenuto (app.3f9a1c2b7e.js), i fratelli .br/.gz e manifest.json. I template chiedono l'URL con
+`asset("app.js")`: se il manifest non c'è (sviluppo senza build) tornano i file originali e il CSS
+resta quello del CDN di Tailwind.
+
+`AssetFiles` sostituisce StaticFiles: sceglie .br/.gz secondo Accept-Encoding, risponde 304 su
+ETag/If-Modified-Since, supporta Range (un solo intervallo, sulla versione non compressa: serve ai
+lettori PDF) e mette Cache-Control immutable sui file con hash, che non cambiano mai.
+"""
+import json
+import mimetypes
+import os
+import re
+
+import anyio
+from fastapi.staticfiles import StaticFiles
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse, Response
+from starlette.staticfiles import NotModifiedResponse
+
+STATIC_DIR = os.path.join(os.path.dirname(__file__), "static")
+DIST_DIR = os.path.join(STATIC_DIR, "dist")
+MANIFEST = os.path.join(DIST_DIR, "manifest.json")
+
+HASHED = re.compile(r"\.[0-9a-f]{10}\.[A-Za-z0-9]+$")
+IMMUTABLE = "public, max-age=31536000, immutable"
+REVALIDATE = "no-cache"
+ENCODINGS = (("br", ".br"), ("gzip", ".gz"))
+CHUNK = 64 * 1024
+
+_manifest: dict[str, str] | None = None
+
+
+def manifest() -> dict[str, str]:
+    global _manifest
+    if _manifest is None:
+        try:
+            with open(MANIFEST, encoding="utf-8") as f:
+                _manifest = json.load(f)
+        except FileNotFoundError:
+            _manifest = {}
+    return _manifest
+
+
+def url(name: str) -> str | None:
+    """URL pubblico di un asset: versione con hash se buildata, altrimenti il file originale (o None)."""
+    built = manifest().get(name)
+    if built:
+        return f"/static/dist/{built}"
+    if os.path.exists(os.path.join(STATIC_DIR, name)):
+        return f"/static/{name}"
+    return None
+
+
+def _accepted(header: str) -> set[str]:
+    out = set()
+    for part in header.split(","):
+        coding, _, params = part.strip().partition(";")
+        q = params.strip()
+        if q.startswith("q="):
+            try:
+                if float(q[2:]) <= 0:
+                    continue
+            except ValueError:
+                continue
+        out.add(coding.strip().lower())
+    return out
+
+
+def parse_range(header: str, size: int):
+    """(start, end) inclusivi; None se l'header va ignorato; "unsatisfiable" per il 416."""
+    m = re.fullmatch(r"bytes=(\d*)-(\d*)", header.strip())
+    if not m or m.group(1) == m.group(2) == "":
+        return None  # formato non gestito o più intervalli: si risponde col file intero
+    first, last = m.groups()
+    if first == "":
+        n = int(last)
+        if n == 0:
+            return "unsatisfiable"
+        return max(0, size - n), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size:
+        return "unsatisfiable"
+    if end < start:
+        return None
+    return start, end
+
+
+class FileRangeResponse(Response):
+    """206 con una porzione del file, letta a blocchi."""
+
+    def __init__(self, path: str, start: int, end: int, size: int, headers: dict, media_type: str):
+        headers = {**headers, "content-range": f"bytes {start}-{end}/{size}", "content-length": str(end - start + 1)}
+        super().__init__(status_code=206, headers=headers, media_type=media_type)
+        self.path, self.start, self.end = path, start, end
+
+    async def __call__(self, scope, receive, send):
+        await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+        if scope["method"].upper() == "HEAD":
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+            return
+        remaining = self.end - self.start + 1
+        async with await anyio.open_file(self.path, "rb") as f:
+            await f.seek(self.start)
+            while remaining:
+                chunk = await f.read(min(CHUNK, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                await send({"type": "http.response.body", "body": chunk, "more_body": remaining > 0})
+        if remaining:
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+
+
+class AssetFiles(StaticFiles):
+    def file_response(self, full_path, stat_result, scope, status_code: int = 200) -> Response:
+        request_headers = Headers(scope=scope)
+        full_path = str(full_path)
+        media_type = mimetypes.guess_type(full_path)[0] or "text/plain"
+        headers = {
+            "cache-control": IMMUTABLE if HASHED.search(full_path) else REVALIDATE,
+            "vary": "Accept-Encoding",
+        }
+        range_header = request_headers.get("range") if status_code == 200 else None
+
+        # variante precompressa (mai per le Range: gli intervalli si riferiscono al file originale)
+        path, stat = full_path, stat_result
+        if not range_header:
+            accepted = _accepted(request_headers.get("accept-encoding", ""))
+            for coding, suffix in ENCODINGS:
+                if coding not in accepted:
+                    continue
+                try:
+                    stat = os.stat(full_path + suffix)
+                except OSError:
+                    continue
+                path = full_path + suffix
+                headers["content-encoding"] = coding
+                break
+        if "content-encoding" not in headers:
+            headers["accept-ranges"] = "bytes"
+
+        response = FileResponse(path, status_code=status_code, stat_result=stat, headers=headers,
+                                media_type=media_type)
+        if status_code == 200 and self.is_not_modified(response.headers, request_headers):
+            return NotModifiedResponse(response.headers)
+        if not range_header:
+            return response
+
+        etag = response.headers["etag"]
+        if_range = request_headers.get("if-range")
+        if if_range and if_range.strip() not in (etag, response.headers["last-modified"]):
+            return response  # il file è cambiato rispetto alla copia parziale del client: tutto da capo
+        size = stat.st_size
+        rng = parse_range(range_header, size)
+        if rng is None:
+            return response
+        if rng == "unsatisfiable":
+            return Response(status_code=416, headers={**headers, "content-range": f"bytes */{size}"})
+        cached = {k: response.headers[k] for k in ("etag", "last-modified")}
+        return FileRangeResponse(path, rng[0], rng[1], size, {**headers, **cached}, media_type)
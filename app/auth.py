@@ -1,40 +1,219 @@
+import asyncio
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
 from datetime import datetime, timedelta
 from jose import jwt, JWTError
 from passlib.context import CryptContext
 from fastapi import HTTPException, Depends, Cookie
+from sqlalchemy import event
 from sqlalchemy.orm import Session
-from .database import get_db
+from .database import get_async_db, run_db
 from .models import User
-import os
+import os, threading, time
 
 ALGORITHM = "HS256"
 SECRET_KEY = os.getenv("SECRET_KEY", "dev-secret-change-me")
 ACCESS_TOKEN_EXPIRE_MINUTES = 60 * 12
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
+USER_CACHE_TTL = float(os.getenv("USER_CACHE_TTL", "60"))
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", "256"))
+
 def hash_password(p: str) -> str:
     return pwd_context.hash(p)
 
 def verify_password(p: str, h: str) -> bool:
     return pwd_context.verify(p, h)
 
+# ------------ BCRYPT FUORI DALL'EVENT LOOP ------------
+# bcrypt è CPU-bound: gira in un pool dedicato e limitato, così un'ondata di login
+# non blocca il loop né si prende tutti i core dell'istanza.
+PWD_WORKERS = int(os.getenv("PWD_WORKERS", "2"))
+PWD_MAX_PENDING = int(os.getenv("PWD_MAX_PENDING", "16"))
+_pwd_executor = ThreadPoolExecutor(max_workers=PWD_WORKERS, thread_name_prefix="bcrypt")
+_pwd_pending = 0
+
+class PasswordPoolBusy(Exception):
+    pass
+
+async def _run_pwd(fn, *args):
+    global _pwd_pending
+    if _pwd_pending >= PWD_MAX_PENDING:
+        raise PasswordPoolBusy()
+    _pwd_pending += 1
+    try:
+        return await asyncio.get_running_loop().run_in_executor(_pwd_executor, fn, *args)
+    finally:
+        _pwd_pending -= 1
+
+async def hash_password_async(p: str) -> str:
+    return await _run_pwd(hash_password, p)
+
+async def verify_password_async(p: str, h: str) -> bool:
+    return await _run_pwd(verify_password, p, h)
+
+# ------------ LIMITE TENTATIVI DI LOGIN ------------
+# Token bucket in memoria per (username, IP) e per IP: ogni tentativo consuma un gettone prima di
+# bcrypt (così N tentativi concorrenti non passano tutti), i gettoni si ricaricano a velocità
+# costante. Il bucket utente è per coppia (username, IP): chi sbaglia da un altro IP non blocca
+# il vero utente. Il tetto per account da tutti gli IP è molto più alto e conta solo i fallimenti.
+# Oltre LOGIN_BUCKETS_MAX si scarta il bucket usato meno di recente (LRU, O(1)).
+LOGIN_USER_BURST = float(os.getenv("LOGIN_USER_BURST", "5"))
+LOGIN_USER_PER_MIN = float(os.getenv("LOGIN_USER_PER_MIN", "5"))
+LOGIN_IP_BURST = float(os.getenv("LOGIN_IP_BURST", "20"))
+LOGIN_IP_PER_MIN = float(os.getenv("LOGIN_IP_PER_MIN", "20"))
+LOGIN_ACCOUNT_BURST = float(os.getenv("LOGIN_ACCOUNT_BURST", "100"))
+LOGIN_ACCOUNT_PER_MIN = float(os.getenv("LOGIN_ACCOUNT_PER_MIN", "30"))
+LOGIN_BUCKETS_MAX = 10_000
+
+class TokenBucketLimiter:
+    def __init__(self, burst: float, per_min: float):
+        self.burst = burst
+        self.rate = per_min / 60.0
+        self._buckets: "OrderedDict[str, tuple[float, float]]" = OrderedDict()
+
+    def _level(self, key: str, now: float) -> float:
+        tokens, last = self._buckets.get(key, (self.burst, now))
+        return min(self.burst, tokens + (now - last) * self.rate)
+
+    def retry_after(self, key: str) -> float:
+        """Secondi di attesa prima del prossimo tentativo (0 = consentito)."""
+        level = self._level(key, time.monotonic())
+        return 0.0 if level >= 1 else (1 - level) / self.rate
+
+    def consume(self, key: str, tokens: float = 1):
+        now = time.monotonic()
+        self._buckets[key] = (self._level(key, now) - tokens, now)
+        self._buckets.move_to_end(key)
+        while len(self._buckets) > LOGIN_BUCKETS_MAX:
+            self._buckets.popitem(last=False)
+
+    def refund(self, key: str):
+        if key in self._buckets:
+            self.consume(key, -1)
+
+    def reset(self, key: str):
+        self._buckets.pop(key, None)
+
+login_user_limiter = TokenBucketLimiter(LOGIN_USER_BURST, LOGIN_USER_PER_MIN)
+login_ip_limiter = TokenBucketLimiter(LOGIN_IP_BURST, LOGIN_IP_PER_MIN)
+login_account_limiter = TokenBucketLimiter(LOGIN_ACCOUNT_BURST, LOGIN_ACCOUNT_PER_MIN)
+
+def _user_key(username: str, ip: str) -> str:
+    return f"{username.lower()}|{ip}"
+
+def login_retry_after(username: str, ip: str) -> float:
+    return max(login_user_limiter.retry_after(_user_key(username, ip)), login_ip_limiter.retry_after(ip),
+               login_account_limiter.retry_after(username.lower()))
+
+def begin_login_attempt(username: str, ip: str) -> float:
+    """Consuma subito un gettone per (username, IP) e IP: 0 = si può verificare la password, altrimenti i secondi di attesa."""
+    wait = login_retry_after(username, ip)
+    if wait <= 0:
+        login_ip_limiter.consume(ip)
+        login_user_limiter.consume(_user_key(username, ip))
+    return wait
+
+def end_login_attempt(username: str, ip: str, ok: bool | None):
+    """ok=True: login riuscito, il bucket (username, IP) riparte pieno; False: fallimento, conta anche per
+    l'account; None: password non verificata, gettoni resi."""
+    if ok:
+        login_user_limiter.reset(_user_key(username, ip))
+    elif ok is None:
+        login_ip_limiter.refund(ip)
+        login_user_limiter.refund(_user_key(username, ip))
+    else:
+        login_account_limiter.consume(username.lower())
+
 def create_access_token(data: dict, expires_delta: timedelta | None = None):
     to_encode = data.copy()
     expire = datetime.utcnow() + (expires_delta or timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES))
-    to_encode.update({"exp": expire})
+    to_encode.update({"exp": expire, "iat": int(time.time())})
     return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
 
-async def get_current_user(db: Session = Depends(get_db), token: str | None = Cookie(default=None, alias="access_token")) -> User:
+# ------------ CACHE UTENTI ------------
+# Snapshot degli utenti autenticati, chiave (username, iat del token), con TTL e LRU.
+# Le modifiche a un User (ruolo, is_active) fatte via ORM invalidano le voci di quell'utente.
+@dataclass(frozen=True)
+class AuthUser:
+    id: int | None
+    username: str
+    role: str
+    is_active: bool = True
+
+_user_cache: "OrderedDict[tuple[str, int], tuple[float, AuthUser | None]]" = OrderedDict()
+_user_changed_at: dict[str, float] = {}
+_user_cache_lock = threading.Lock()
+
+def invalidate_user(username: str):
+    with _user_cache_lock:
+        _user_changed_at[username] = time.time()
+        for key in [k for k in _user_cache if k[0] == username]:
+            del _user_cache[key]
+
+@event.listens_for(User, "after_update")
+@event.listens_for(User, "after_delete")
+def _on_user_change(mapper, connection, target):
+    invalidate_user(target.username)
+
+def decode_token(token: str | None) -> dict | None:
     if not token:
-        raise HTTPException(status_code=401, detail="Non autenticato")
+        return None
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        username: str = payload.get("sub")
-        if username is None:
-            raise HTTPException(status_code=401, detail="Token invalido")
     except JWTError:
+        return None
+    return payload if payload.get("sub") else None
+
+def token_is_fresh(payload: dict) -> bool:
+    # token emesso dopo l'ultima modifica nota dell'utente
+    changed = _user_changed_at.get(payload["sub"])
+    return changed is None or payload.get("iat", 0) > changed
+
+_MISS = object()
+
+def cached_user(payload: dict):
+    """Utente dalla cache, oppure _MISS se serve andare sul DB."""
+    key = (payload["sub"], payload.get("iat", 0))
+    with _user_cache_lock:
+        hit = _user_cache.get(key)
+        if hit and hit[0] > time.monotonic():
+            _user_cache.move_to_end(key)
+            return hit[1]
+    return _MISS
+
+def load_user(db: Session, payload: dict) -> AuthUser | None:
+    """Utente attivo per il token, dalla cache se possibile, altrimenti dal DB."""
+    hit = cached_user(payload)
+    if hit is not _MISS:
+        return hit
+    username = payload["sub"]
+    key = (username, payload.get("iat", 0))
+    now = time.monotonic()
+    u = db.query(User).filter(User.username == username, User.is_active == True).first()
+    snap = AuthUser(u.id, u.username, u.role, u.is_active) if u else None
+    with _user_cache_lock:
+        _user_cache[key] = (now + USER_CACHE_TTL, snap)
+        _user_cache.move_to_end(key)
+        while len(_user_cache) > USER_CACHE_SIZE:
+            _user_cache.popitem(last=False)
+    return snap
+
+async def resolve_user(db, payload: dict) -> AuthUser | None:
+    """Ruolo e stato dal DB (cache per token con TTL): da usare per ogni decisione di autorizzazione."""
+    user = cached_user(payload)
+    if user is _MISS:
+        user = await run_db(db, load_user, payload)
+    return user
+
+async def get_current_user(db = Depends(get_async_db), token: str | None = Cookie(default=None, alias="access_token")) -> AuthUser:
+    if not token:
+        raise HTTPException(status_code=401, detail="Non autenticato")
+    payload = decode_token(token)
+    if payload is None:
         raise HTTPException(status_code=401, detail="Token invalido")
-    user = db.query(User).filter(User.username == username).first()
+    user = await resolve_user(db, payload)
     if not user or not user.is_active:
         raise HTTPException(status_code=401, detail="Utente non attivo")
     return user
@@ -0,0 +1,154 @@
+"""
+Ledger `member_balances`: saldo per membro mantenuto in modo incrementale.
+
+Ogni scrittura su `movements` deve passare da `record_movement` / `revert_movement`
+nella stessa transazione. Da riga di comando:
+
+    python -m app.balances rebuild   # ricalcola tutto da movements
+    python -m app.balances check     # confronta ledger e movements
+"""
+import sys
+
+from sqlalchemy import func, case
+from sqlalchemy.orm import Session
+
+from .database import SessionLocal
+from .migrations import upgrade
+from .models import Member, Movement, MemberBalance
+
+
+def _get_or_create(db: Session, member_id: int) -> MemberBalance:
+    row = db.get(MemberBalance, member_id)
+    if row is None:
+        row = MemberBalance(member_id=member_id, crocette_prese=0, crocette_pagate=0, last_movement_at=None)
+        db.add(row)
+        db.flush()
+    return row
+
+
+def record_movement(db: Session, mv: Movement):
+    # created_at ha un default lato Python: lo materializziamo col flush
+    if mv.created_at is None:
+        db.flush()
+    row = _get_or_create(db, mv.member_id)
+    if mv.kind == "debit":
+        row.crocette_prese = MemberBalance.crocette_prese + mv.crocette
+    elif mv.kind == "credit":
+        row.crocette_pagate = MemberBalance.crocette_pagate + mv.crocette
+    row.last_movement_at = func.coalesce(
+        case((MemberBalance.last_movement_at > mv.created_at, MemberBalance.last_movement_at), else_=mv.created_at),
+        mv.created_at,
+    )
+    # le espressioni SQL vanno scritte subito, altrimenti un secondo movimento le sovrascrive
+    db.flush()
+
+
+def revert_movement(db: Session, mv: Movement):
+    # da chiamare DOPO db.delete(mv): l'ultimo movimento va ricalcolato senza di lui
+    db.flush()
+    row = _get_or_create(db, mv.member_id)
+    if mv.kind == "debit":
+        row.crocette_prese = MemberBalance.crocette_prese - mv.crocette
+    elif mv.kind == "credit":
+        row.crocette_pagate = MemberBalance.crocette_pagate - mv.crocette
+    row.last_movement_at = (
+        db.query(func.max(Movement.created_at)).filter(Movement.member_id == mv.member_id).scalar_subquery()
+    )
+    db.flush()
+
+
+def deltas_for(rows) -> dict:
+    """Raggruppa righe di movimento (dict con member_id, kind, crocette, created_at) per membro."""
+    deltas = {}
+    for r in rows:
+        deb, cre, last = deltas.get(r["member_id"], (0, 0, r["created_at"]))
+        if r["kind"] == "debit":
+            deb += r["crocette"]
+        else:
+            cre += r["crocette"]
+        deltas[r["member_id"]] = (deb, cre, max(last, r["created_at"]))
+    return deltas
+
+
+def apply_deltas(db: Session, deltas: dict):
+    """Aggiorna il ledger dopo un insert massivo: deltas = {member_id: (prese, pagate, ultimo created_at)}.
+
+    Una UPDATE per membro toccato, indipendentemente dal numero di movimenti.
+    """
+    for member_id, (deb, cre, last) in deltas.items():
+        row = _get_or_create(db, member_id)
+        row.crocette_prese = MemberBalance.crocette_prese + deb
+        row.crocette_pagate = MemberBalance.crocette_pagate + cre
+        row.last_movement_at = func.coalesce(
+            case((MemberBalance.last_movement_at > last, MemberBalance.last_movement_at), else_=last),
+            last,
+        )
+    db.flush()
+
+
+def _computed(db: Session):
+    deb = func.coalesce(func.sum(case((Movement.kind == "debit", Movement.crocette), else_=0)), 0)
+    cre = func.coalesce(func.sum(case((Movement.kind == "credit", Movement.crocette), else_=0)), 0)
+    q = (
+        db.query(Member.id, deb, cre, func.max(Movement.created_at))
+        .outerjoin(Movement, Movement.member_id == Member.id)
+        .group_by(Member.id)
+    )
+    return {mid: (d, c, last) for mid, d, c, last in q}
+
+
+def rebuild(db: Session) -> int:
+    db.query(MemberBalance).delete(synchronize_session=False)
+    computed = _computed(db)
+    db.add_all([
+        MemberBalance(member_id=mid, crocette_prese=d, crocette_pagate=c, last_movement_at=last)
+        for mid, (d, c, last) in computed.items()
+    ])
+    db.flush()
+    return len(computed)
+
+
+def check(db: Session):
+    """Ritorna la lista delle differenze (member_id, atteso, trovato)."""
+    stored = {
+        b.member_id: (b.crocette_prese, b.crocette_pagate, b.last_movement_at)
+        for b in db.query(MemberBalance).all()
+    }
+    diffs = []
+    for mid, expected in _computed(db).items():
+        found = stored.pop(mid, (0, 0, None))
+        if tuple(found) != tuple(expected):
+            diffs.append((mid, expected, found))
+    for mid, found in stored.items():
+        diffs.append((mid, None, found))
+    return diffs
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    cmd = argv[0] if argv else "check"
+    upgrade()
+    db = SessionLocal()
+    try:
+        if cmd == "rebuild":
+            n = rebuild(db)
+            db.commit()
+            print(f"OK ✔ Ricalcolati {n} saldi.")
+        elif cmd == "check":
+            diffs = check(db)
+            for mid, expected, found in diffs:
+                print(f"[DIFF] member_id={mid} atteso={expected} trovato={found}")
+            if diffs:
+                print(f"{len(diffs)} saldi non allineati: esegui `python -m app.balances rebuild`.")
+                return 1
+            print("OK ✔ Ledger allineato.")
+        else:
+            print("Uso: python -m app.balances [rebuild|check]")
+            return 2
+        return 0
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
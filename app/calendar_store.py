@@ -0,0 +1,250 @@
+"""
+Calendario (paste, partite, compleanni) salvato nel database.
+
+L'admin continua a scrivere il calendario come testo libero: al salvataggio il testo viene parsato
+una volta sola e ogni evento riconosciuto diventa una riga di `calendar_events` (data, tipo, chi,
+riga originale); il testo così com'è resta in `calendar_source` per l'editor. Le pagine leggono
+"prossime paste" e "prossima partita" con query per intervallo sull'indice (type, date), e
+/calendar.txt serve il testo salvato, commenti e righe non riconosciute compresi: niente file locale
+da tenere allineato tra istanze o da perdere a un redeploy.
+
+    python -m app.calendar_store load FILE   # sostituisce il calendario con il contenuto del file
+    python -m app.calendar_store export      # stampa il testo del calendario (come /calendar.txt)
+
+Da qui esce anche il feed iCalendar di /calendar.ics (`to_ics`), per i calendari del telefono.
+"""
+import hashlib
+import os
+import re
+import sys
+from datetime import datetime, timedelta
+
+from sqlalchemy import delete, func, insert, or_
+from sqlalchemy.orm import Session
+
+from . import metrics
+from .database import SessionLocal
+from .migrations import upgrade
+from .models import CalendarEvent, CalendarSource
+
+# file usato solo per popolare il DB la prima volta (migrazione 006); CALENDAR_FILE per i dataset del benchmark
+SEED_FILE = os.getenv("CALENDAR_FILE") or os.path.join(os.path.dirname(__file__), "data", "calendar.txt")
+
+MONTHS_IT = {
+    "gen":1, "gennaio":1, "feb":2, "febbraio":2, "mar":3, "marzo":3, "apr":4, "aprile":4,
+    "mag":5, "maggio":5, "giu":6, "giugno":6, "lug":7, "luglio":7, "ago":8, "agosto":8,
+    "set":9, "sett":9, "settembre":9, "ott":10, "ottobre":10, "nov":11, "novembre":11,
+    "dic":12, "dicembre":12,
+}
+
+EMOJIS = {"paste":"🍕", "home":"🏠", "away":"✈️", "birthday":"🎂"}
+EMOJI_SET = set(EMOJIS.values())
+EMOJI_TO_TYPE = {e: t for t, e in EMOJIS.items()}
+
+DEFAULT_CALENDAR = """\
+# Esempi (una riga per evento). Modifica liberamente:
+# 2025-10-14 🍕 Dani
+# 2025-10-18 🏠 Scanzo vs XYZ
+# 2025-10-25 ✈️ Trasferta vs ABC
+# 2025-11-02 🎂 Mirco
+"""
+
+
+def parse_date_any(s: str):
+    s = s.strip().lower()
+    m = re.search(r"(\d{4})[-/.](\d{1,2})[-/.](\d{1,2})", s)
+    if m:
+        y, mo, d = map(int, m.groups())
+        return datetime(y, mo, d)
+    m = re.search(r"(\d{1,2})[-/.](\d{1,2})[-/.](\d{2,4})", s)
+    if m:
+        d, mo, y = m.groups()
+        d, mo, y = int(d), int(mo), int(y)
+        if y < 100: y += 2000
+        return datetime(y, mo, d)
+    m = re.search(r"(\d{1,2})\s+([a-zà]+)(?:\s+(\d{4}))?", s)
+    if m:
+        d = int(m.group(1)); mm = m.group(2).strip("."); y = m.group(3)
+        mo = MONTHS_IT.get(mm, None)
+        if mo:
+            if y: y = int(y)
+            else: y = 2025 if mo >= 8 else 2026
+            return datetime(y, mo, d)
+    return None
+
+
+def normalize_line(line: str):
+    return re.sub(r"\s+", " ", line).strip()
+
+
+# Fast path per il formato dominante del file: "11/9/2025🍕 RESE Jr"
+_FAST_LINE = re.compile(r"^(\d{1,2})/(\d{1,2})/(\d{4}) ?(" + "|".join(map(re.escape, EMOJIS.values())) + r")(.*)$")
+
+
+def parse_calendar_text(text: str):
+    ev = []
+    for n, raw in enumerate(text.splitlines()):
+        if not raw.strip() or raw.strip().startswith("#"):
+            continue
+        line = normalize_line(raw)
+        m = _FAST_LINE.match(line)
+        # righe con più emoji (es. "🍕 🎂 GIORGIO") passano dal parser generico
+        if m and not any(e in m.group(5) for e in EMOJI_SET):
+            d, mo, y, found, after = m.groups()
+            try:
+                ev.append({"date": datetime(int(y), int(mo), int(d)), "type": EMOJI_TO_TYPE[found],
+                           "who": after.strip(" -:—").strip(), "emoji": found, "raw": raw, "line": n})
+                continue
+            except ValueError:
+                pass  # data non valida: lasciamo decidere al parser generico
+        found = next((e for e in EMOJI_SET if e in line), None)
+        if not found:
+            continue
+        d = parse_date_any(line) or parse_date_any(line.split(found, 1)[0])
+        if d is None:
+            continue
+        after = line.split(found, 1)[1].strip(" -:—").strip()
+        typ = EMOJI_TO_TYPE[found]
+        ev.append({"date": d, "type": typ, "who": after, "emoji": found, "raw": raw, "line": n})
+    ev.sort(key=lambda x: (x["date"], x["line"]))
+    return ev
+
+
+CAL_GROUPS = {"paste": ("paste",), "match": ("home", "away"), "birthday": ("birthday",)}
+
+
+def save(db: Session, text: str) -> int:
+    """Parsa il testo e sostituisce tutti gli eventi. Il commit resta al chiamante."""
+    text = text or ""
+    with metrics.timed("calendar"):
+        events = parse_calendar_text(text)
+    db.execute(delete(CalendarEvent), execution_options={"synchronize_session": False})
+    if events:
+        db.execute(insert(CalendarEvent), [
+            {"date": e["date"], "type": e["type"], "who": e["who"][:200], "emoji": e["emoji"],
+             "raw": e["raw"], "line": e["line"]}
+            for e in events
+        ])
+    src = db.get(CalendarSource, 1) or CalendarSource(id=1)
+    src.text = text
+    src.updated_at = datetime.utcnow()
+    db.add(src)
+    db.flush()
+    return len(events)
+
+
+def ensure_seeded(db: Session) -> bool:
+    """Prima volta: importa il vecchio calendar.txt (o gli esempi) se il DB non ha ancora un calendario."""
+    if db.get(CalendarSource, 1) is not None:
+        return False
+    text = DEFAULT_CALENDAR
+    if os.path.exists(SEED_FILE):
+        with open(SEED_FILE, "r", encoding="utf-8") as f:
+            text = f.read()
+    save(db, text)
+    return True
+
+
+def source_text(db: Session) -> str:
+    src = db.get(CalendarSource, 1)
+    return src.text if src else ""
+
+
+def _event(e: CalendarEvent) -> dict:
+    return {"date": e.date, "type": e.type, "who": e.who, "emoji": e.emoji, "raw": e.raw}
+
+
+def upcoming(db: Session, group: str, now: datetime, n: int | None = None) -> list[dict]:
+    q = (
+        db.query(CalendarEvent)
+        .filter(CalendarEvent.type.in_(CAL_GROUPS[group]), CalendarEvent.date >= now)
+        .order_by(CalendarEvent.date, CalendarEvent.line)
+    )
+    if n is not None:
+        q = q.limit(n)
+    return [_event(e) for e in q]
+
+
+def events(db: Session, who: str | None = None) -> list[CalendarEvent]:
+    """Tutti gli eventi; con `who` solo quelli di quella persona più le partite, che sono di tutti."""
+    q = db.query(CalendarEvent).order_by(CalendarEvent.date, CalendarEvent.line)
+    if who:
+        pattern = "%" + who.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+        q = q.filter(or_(CalendarEvent.type.in_(CAL_GROUPS["match"]),
+                         func.lower(CalendarEvent.who).like(pattern.lower(), escape="\\")))
+    return q.all()
+
+
+def updated_at(db: Session) -> datetime | None:
+    # solo la colonna, senza caricare il testo: è la versione del calendario per le cache
+    return db.query(CalendarSource.updated_at).filter(CalendarSource.id == 1).scalar()
+
+
+# ------------ iCalendar (RFC 5545) ------------
+ICS_SUMMARY = {"paste": "🍕 Paste: {who}", "home": "🏠 In casa: {who}", "away": "✈️ Trasferta: {who}",
+               "birthday": "🎂 Compleanno: {who}"}
+
+
+def _ics_text(value: str) -> str:
+    return value.replace("\\", "\\\\").replace(";", "\\;").replace(",", "\\,").replace("\n", "\\n")
+
+
+def _ics_fold(line: str) -> str:
+    # righe al massimo di 75 byte, le successive iniziano con uno spazio (senza spezzare i caratteri UTF-8)
+    out, cur, size = [], "", 0
+    for ch in line:
+        n = len(ch.encode())
+        if size + n > 75:
+            out.append(cur)
+            cur, size = " ", 1
+        cur += ch
+        size += n
+    out.append(cur)
+    return "\r\n".join(out)
+
+
+def to_ics(evs, stamp: datetime | None, name: str = "Crocette") -> str:
+    """Eventi di un giorno intero; UID stabile (data, tipo, chi) così i telefoni aggiornano invece di duplicare."""
+    dtstamp = f"{stamp or datetime.utcnow():%Y%m%dT%H%M%SZ}"
+    lines = ["BEGIN:VCALENDAR", "VERSION:2.0", "PRODID:-//Crocette//Calendario//IT", "CALSCALE:GREGORIAN",
+             "METHOD:PUBLISH", f"X-WR-CALNAME:{_ics_text(name)}", "X-WR-TIMEZONE:Europe/Rome"]
+    for e in evs:
+        who = e.who or ""
+        uid = hashlib.sha1(f"{e.date:%Y%m%d}|{e.type}|{who.lower()}".encode()).hexdigest()[:20]
+        lines += [
+            "BEGIN:VEVENT",
+            f"UID:{uid}@crocette",
+            f"DTSTAMP:{dtstamp}",
+            f"DTSTART;VALUE=DATE:{e.date:%Y%m%d}",
+            f"DTEND;VALUE=DATE:{e.date + timedelta(days=1):%Y%m%d}",
+            f"SUMMARY:{_ics_text(ICS_SUMMARY[e.type].format(who=who).rstrip(': '))}",
+            "TRANSP:TRANSPARENT",
+            "END:VEVENT",
+        ]
+    lines.append("END:VCALENDAR")
+    return "\r\n".join(_ics_fold(line) for line in lines) + "\r\n"
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    cmd = argv[0] if argv else ""
+    upgrade()
+    db = SessionLocal()
+    try:
+        if cmd == "load" and len(argv) == 2:
+            with open(argv[1], "r", encoding="utf-8") as f:
+                n = save(db, f.read())
+            db.commit()
+            print(f"OK ✔ Calendario caricato: {n} eventi.")
+        elif cmd == "export":
+            sys.stdout.write(source_text(db))
+        else:
+            print("Uso: python -m app.calendar_store [load FILE|export]")
+            return 2
+        return 0
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,191 @@
+"""
+Compressione dinamica delle risposte e minificazione opzionale dell'HTML.
+
+`CompressionMiddleware` (ASGI puro come MetricsMiddleware) comprime con brotli, se il modulo è
+installato e il client lo accetta, altrimenti con gzip:
+- solo i tipi testuali (HTML, JSON, CSV, testo, iCalendar...) e solo sopra COMPRESS_MIN_BYTES;
+- le risposte in streaming (export dello storico) vengono compresse a blocchi, senza bufferizzarle;
+- mai gli eventi SSE (text/event-stream: ogni evento deve arrivare subito), le HEAD, le risposte già
+  codificate o con Accept-Ranges (gli asset statici hanno le loro varianti .br/.gz precompresse).
+
+Con HTML_MINIFY=1 l'output dei template viene ripulito dagli spazi superflui e dai commenti HTML,
+lasciando intatti <pre>, <textarea> (il calendario), <script> e <style>.
+
+Le risposte già in cache (HTML anonimo della dashboard) si comprimono una volta con `encode` e
+arrivano qui con Content-Encoding già impostato: il middleware le lascia passare.
+
+Tempo di compressione/minificazione e dimensioni finiscono in Server-Timing e /metrics, così si
+possono regolare GZIP_LEVEL e BROTLI_QUALITY guardando i numeri veri.
+"""
+import os
+import re
+import time
+import zlib
+
+from starlette.datastructures import Headers, MutableHeaders
+
+from . import metrics
+
+try:
+    import brotli
+except ImportError:  # opzionale: senza, solo gzip
+    brotli = None
+
+COMPRESS_MIN_BYTES = int(os.getenv("COMPRESS_MIN_BYTES", "1024"))
+GZIP_LEVEL = int(os.getenv("GZIP_LEVEL", "6"))
+BROTLI_QUALITY = int(os.getenv("BROTLI_QUALITY", "4"))  # qualità bassa: veloce, adatta alla compressione al volo
+HTML_MINIFY = os.getenv("HTML_MINIFY", "0").lower() in ("1", "true", "yes")
+
+COMPRESSIBLE = (
+    "text/html", "text/plain", "text/csv", "text/calendar", "text/css", "text/javascript",
+    "application/json", "application/x-ndjson", "application/javascript", "image/svg+xml",
+)
+
+
+def choose_encoding(accept_encoding: str) -> str | None:
+    accepted = set()
+    for part in accept_encoding.lower().split(","):
+        coding, _, params = part.strip().partition(";")
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                if float(params[2:]) <= 0:
+                    continue
+            except ValueError:
+                continue
+        accepted.add(coding.strip())
+    if brotli is not None and "br" in accepted:
+        return "br"
+    if "gzip" in accepted:
+        return "gzip"
+    return None
+
+
+class _Compressor:
+    def __init__(self, coding: str):
+        self.coding = coding
+        if coding == "br":
+            self._c = brotli.Compressor(quality=BROTLI_QUALITY)
+            self._compress, self._finish = self._c.process, self._c.finish
+        else:
+            self._c = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)  # 31 = formato gzip
+            self._compress, self._finish = self._c.compress, self._c.flush
+        self.seconds = 0.0
+
+    def compress(self, data: bytes, last: bool) -> bytes:
+        t0 = time.perf_counter()
+        with metrics.timed("compress"):
+            out = self._compress(data) if data else b""
+            if last:
+                out += self._finish()
+        self.seconds += time.perf_counter() - t0
+        return out
+
+
+def encode(body: bytes, coding: str, route: str) -> bytes:
+    """Comprime un body intero con le stesse impostazioni del middleware (per le risposte in cache)."""
+    compressor = _Compressor(coding)
+    out = compressor.compress(body, last=True)
+    metrics.registry.record_compression(route, coding, len(body), len(out), compressor.seconds)
+    return out
+
+
+class CompressionMiddleware:
+    def __init__(self, app, minimum_size: int = COMPRESS_MIN_BYTES):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        coding = None if scope["method"] == "HEAD" else choose_encoding(
+            Headers(scope=scope).get("accept-encoding", ""))
+        start = None
+        compressor: _Compressor | None = None
+        passthrough = False
+        encoding = "identity"
+        raw_bytes = sent_bytes = 0
+
+        async def send_compressed(message):
+            nonlocal start, compressor, passthrough, encoding, raw_bytes, sent_bytes
+            if message["type"] == "http.response.start":
+                headers = Headers(raw=message.get("headers", []))
+                ctype = headers.get("content-type", "").split(";")[0].strip().lower()
+                if (ctype == "text/event-stream" or ctype not in COMPRESSIBLE
+                        or "content-encoding" in headers or "accept-ranges" in headers):
+                    passthrough = True
+                    encoding = headers.get("content-encoding", "identity")  # es. varianti in cache
+                    await send(message)
+                    return
+                start = message  # gli header si decidono col primo pezzo di body
+                return
+            if message["type"] != "http.response.body":
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more = message.get("more_body", False)
+            raw_bytes += len(body)
+            if passthrough:
+                sent_bytes += len(body)
+                await send(message)
+                return
+
+            if start is not None:
+                headers = MutableHeaders(raw=list(start["headers"]))
+                headers.add_vary_header("Accept-Encoding")
+                if coding is None or (not more and len(body) < self.minimum_size):
+                    passthrough = True
+                    sent_bytes += len(body)
+                    await send({**start, "headers": headers.raw})
+                    start = None
+                    await send(message)
+                    return
+                compressor = _Compressor(coding)
+                encoding = coding
+                headers["content-encoding"] = coding
+                etag = headers.get("etag")
+                if etag and not etag.startswith("W/"):
+                    headers["etag"] = "W/" + etag  # stessa risorsa, byte diversi
+                out = compressor.compress(body, last=not more)
+                if more:
+                    del headers["content-length"]
+                else:
+                    headers["content-length"] = str(len(out))
+                await send({**start, "headers": headers.raw})
+                start = None
+            else:
+                out = compressor.compress(body, last=not more)
+            sent_bytes += len(out)
+            await send({"type": "http.response.body", "body": out, "more_body": more})
+
+        await self.app(scope, receive, send_compressed)
+        if raw_bytes or sent_bytes:
+            route = metrics.route_label(scope)
+            metrics.registry.record_body(scope["method"], route, encoding, sent_bytes)
+            if compressor:
+                metrics.registry.record_compression(route, encoding, raw_bytes, sent_bytes, compressor.seconds)
+
+
+# ------------ MINIFICAZIONE HTML ------------
+_PROTECTED = re.compile(r"(<(pre|textarea|script|style)\b.*?</\2\s*>)", re.S | re.I)
+_COMMENT = re.compile(r"<!--(?!\[if).*?-->", re.S)
+_SPACES_NL = re.compile(r"\s*\n\s*")
+_SPACES = re.compile(r"[ \t\r\f]{2,}")
+
+
+def minify_html(html: str) -> str:
+    """Spazi ridotti al minimo che l'HTML considera equivalente (una sequenza vale uno spazio)."""
+    t0 = time.perf_counter()
+    with metrics.timed("minify"):
+        parts = _PROTECTED.split(html)
+        out = []
+        # split con due gruppi: [testo, blocco protetto, nome tag, testo, ...]
+        for i in range(0, len(parts), 3):
+            text = _COMMENT.sub("", parts[i])
+            out.append(_SPACES.sub(" ", _SPACES_NL.sub("\n", text)))
+            if i + 1 < len(parts):
+                out.append(parts[i + 1])
+        result = "".join(out).strip() + "\n"
+    metrics.registry.record_minify(len(html.encode()), len(result.encode()), time.perf_counter() - t0)
+    return result
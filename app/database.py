@@ -1,7 +1,12 @@
-import os
-from sqlalchemy import create_engine
+import os, threading, time
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.pool import QueuePool, AsyncAdaptedQueuePool, NullPool
+from starlette.concurrency import run_in_threadpool
+
+from .metrics import instrument_engine
 
 # Leggi la connessione dal pannello di Render (che la prenderà da Neon)
 DATABASE_URL = os.getenv("DATABASE_URL")
@@ -9,15 +14,241 @@ DATABASE_URL = os.getenv("DATABASE_URL")
 # Se vuoi fare test in locale:
 # DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./local.db")
 
+# ------------ PROFILO POOL ------------
+# Neon sospende il compute dopo qualche minuto di inattività: conviene riciclare le connessioni
+# prima di quella soglia. Con un pooler esterno (host "-pooler" di Neon / PgBouncer) usare DB_POOL=null.
+#   DB_POOL               queue | null                          (default queue)
+#   DB_POOL_SIZE          connessioni tenute aperte             (default 5)
+#   DB_MAX_OVERFLOW       connessioni extra oltre la size       (default 5)
+#   DB_POOL_TIMEOUT       secondi di attesa per un checkout     (default 30)
+#   DB_POOL_RECYCLE       età massima connessione in secondi    (default 240, -1 = mai)
+#   DB_PRE_PING           1 = ping a ogni checkout, 0 = ottimistico: alla prima disconnessione
+#                         SQLAlchemy invalida il pool e le connessioni vengono ricreate (default 1)
+#   DB_STATEMENT_TIMEOUT  timeout per statement in ms, solo Postgres (default 0 = nessuno;
+#                         passa da `options`, che PgBouncer in transaction mode può rifiutare)
+#   DB_APPLICATION_NAME   application_name visibile in pg_stat_activity (default crocette)
+def _env_int(name: str, default: int) -> int:
+    return int(os.getenv(name, str(default)))
+
+DB_POOL = os.getenv("DB_POOL", "queue").lower()
+DB_POOL_SIZE = _env_int("DB_POOL_SIZE", 5)
+DB_MAX_OVERFLOW = _env_int("DB_MAX_OVERFLOW", 5)
+DB_POOL_TIMEOUT = _env_int("DB_POOL_TIMEOUT", 30)
+DB_POOL_RECYCLE = _env_int("DB_POOL_RECYCLE", 240)
+DB_PRE_PING = os.getenv("DB_PRE_PING", "1").lower() in ("1", "true", "yes")
+DB_STATEMENT_TIMEOUT = _env_int("DB_STATEMENT_TIMEOUT", 0)
+DB_APPLICATION_NAME = os.getenv("DB_APPLICATION_NAME", "crocette")
+
+
+class PoolStats:
+    """Contatori del pool: attesa al checkout ed età delle connessioni consegnate."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self.age_total = 0.0
+        self.age_max = 0.0
+        self.connects = 0
+        self.invalidations = 0
+
+    def record_wait(self, seconds: float):
+        with self._lock:
+            self.checkouts += 1
+            self.wait_total += seconds
+            self.wait_max = max(self.wait_max, seconds)
+
+    def record_age(self, seconds: float):
+        with self._lock:
+            self.age_total += seconds
+            self.age_max = max(self.age_max, seconds)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            n = self.checkouts or 1
+            return {
+                "checkouts": self.checkouts,
+                "checkout_wait_avg_ms": round(self.wait_total / n * 1000, 3),
+                "checkout_wait_max_ms": round(self.wait_max * 1000, 3),
+                "checkout_wait_total_s": round(self.wait_total, 6),
+                "connection_age_avg_s": round(self.age_total / n, 3),
+                "connection_age_max_s": round(self.age_max, 3),
+                "connects": self.connects,
+                "invalidations": self.invalidations,
+            }
+
+
+class _TimedCheckout:
+    # misura il tempo speso dentro il pool per ottenere una connessione
+    stats: PoolStats
+
+    def _do_get(self):
+        t0 = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            self.stats.record_wait(time.perf_counter() - t0)
+
+class TimedQueuePool(_TimedCheckout, QueuePool):
+    stats = PoolStats()
+
+class TimedAsyncQueuePool(_TimedCheckout, AsyncAdaptedQueuePool):
+    stats = PoolStats()
+
+class TimedNullPool(_TimedCheckout, NullPool):
+    stats = PoolStats()
+
+class TimedAsyncNullPool(_TimedCheckout, NullPool):
+    stats = PoolStats()
+
+
+def _is_postgres(url: str) -> bool:
+    return bool(url) and url.startswith("postgres")
+
+def _engine_kwargs(url: str, is_async: bool) -> dict:
+    kw = {"pool_pre_ping": DB_PRE_PING}
+    if not _is_postgres(url):
+        return kw  # SQLite locale: pool di default del dialetto
+    if DB_POOL == "null":
+        kw["poolclass"] = TimedAsyncNullPool if is_async else TimedNullPool
+    else:
+        kw.update(
+            poolclass=TimedAsyncQueuePool if is_async else TimedQueuePool,
+            pool_size=DB_POOL_SIZE,
+            max_overflow=DB_MAX_OVERFLOW,
+            pool_timeout=DB_POOL_TIMEOUT,
+            pool_recycle=DB_POOL_RECYCLE,
+            pool_use_lifo=True,  # le connessioni inattive in coda scadono, le calde restano in uso
+        )
+    options = f"-c statement_timeout={DB_STATEMENT_TIMEOUT}" if DB_STATEMENT_TIMEOUT else None
+    kw["connect_args"] = {"application_name": DB_APPLICATION_NAME, **({"options": options} if options else {})}
+    return kw
+
+def _instrument(sync_engine):
+    stats = getattr(sync_engine.pool, "stats", None)
+    if stats is None:
+        return
+
+    @event.listens_for(sync_engine, "connect")
+    def _on_connect(dbapi_conn, record):
+        record.info["created_at"] = time.monotonic()
+        with stats._lock:
+            stats.connects += 1
+
+    @event.listens_for(sync_engine, "checkout")
+    def _on_checkout(dbapi_conn, record, proxy):
+        stats.record_age(time.monotonic() - record.info.get("created_at", time.monotonic()))
+
+    @event.listens_for(sync_engine, "invalidate")
+    def _on_invalidate(dbapi_conn, record, exc):
+        with stats._lock:
+            stats.invalidations += 1
+
 # Crea engine SQLAlchemy
-engine = create_engine(DATABASE_URL, pool_pre_ping=True)
+engine = create_engine(DATABASE_URL, **_engine_kwargs(DATABASE_URL, is_async=False))
+_instrument(engine)
+instrument_engine(engine)
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
+# ------------ VERSIONE DEI DATI ------------
+# Riga unica di `data_version` (migrazione 007), incrementata nella stessa transazione di ogni
+# commit che ha scritto qualcosa con una Session: route, CLI (app.seasons, app.stats, app.balances,
+# app.calendar_store), script di import e seed. Le cache in-process e gli ETag la confrontano con
+# una lookup per chiave primaria, così vedono anche le scritture di altri processi e istanze.
+_DIRTY = "data_changed"
+
+@event.listens_for(Session, "after_flush")
+def _mark_flush(session, flush_context):
+    if session.new or session.dirty or session.deleted:
+        session.info[_DIRTY] = True
+
+@event.listens_for(Session, "do_orm_execute")
+def _mark_execute(state):
+    # insert/update/delete in blocco (executemany, INSERT ... SELECT, query.delete())
+    if state.is_insert or state.is_update or state.is_delete:
+        state.session.info[_DIRTY] = True
+
+@event.listens_for(Session, "before_commit")
+def _bump_data_version(session):
+    # before_commit gira prima del flush finale: contano anche gli oggetti ancora pendenti
+    if session.info.pop(_DIRTY, False) or session.new or session.dirty or session.deleted:
+        session.execute(text("UPDATE data_version SET version = version + 1 WHERE id = 1"))
+
+@event.listens_for(Session, "after_commit")
+@event.listens_for(Session, "after_rollback")
+def _clear_data_version_flag(session):
+    session.info.pop(_DIRTY, None)
+
+def current_data_version(db: Session) -> int:
+    return db.execute(text("SELECT version FROM data_version WHERE id = 1")).scalar() or 0
+
 def get_db():
     db = SessionLocal()
     try:
         yield db
     finally:
         db.close()
+
+# ------------ MODALITÀ ASYNC ------------
+# DB_MODE=async      -> AsyncSession su engine asyncio (psycopg async per Postgres; per SQLite serve `pip install aiosqlite`)
+# DB_MODE=threadpool -> Session sincrona, le query girano nel threadpool di Starlette
+# Default: async per Postgres, threadpool per tutto il resto.
+def _async_url(url: str) -> str:
+    scheme, _, rest = url.partition("://")
+    if scheme in ("postgres", "postgresql", "postgresql+psycopg2", "postgresql+psycopg"):
+        return "postgresql+psycopg://" + rest
+    if scheme in ("sqlite", "sqlite+pysqlite"):
+        return "sqlite+aiosqlite://" + rest
+    return url
+
+_default_mode = "async" if DATABASE_URL and DATABASE_URL.startswith("postgres") else "threadpool"
+DB_MODE = os.getenv("DB_MODE", _default_mode).lower()
+
+async_engine = (
+    create_async_engine(_async_url(DATABASE_URL), **_engine_kwargs(DATABASE_URL, is_async=True))
+    if DB_MODE == "async" else None
+)
+if async_engine is not None:
+    _instrument(async_engine.sync_engine)
+    instrument_engine(async_engine.sync_engine)
+AsyncSessionLocal = (
+    async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False) if async_engine else None
+)
+
+async def get_async_db():
+    if AsyncSessionLocal is not None:
+        async with AsyncSessionLocal() as db:
+            yield db
+    else:
+        db = SessionLocal()
+        try:
+            yield db
+        finally:
+            await run_in_threadpool(db.close)
+
+async def run_db(db, fn, *args, **kwargs):
+    """Esegue fn(session, ...) senza bloccare l'event loop.
+
+    Con AsyncSession usa run_sync (I/O asincrono del driver), con Session sincrona
+    sposta la chiamata nel threadpool. fn scrive codice ORM sincrono normale.
+    """
+    if isinstance(db, AsyncSession):
+        return await db.run_sync(lambda s: fn(s, *args, **kwargs))
+    return await run_in_threadpool(fn, db, *args, **kwargs)
+
+def pool_stats() -> dict:
+    """Stato dei pool (sync e async) per il tuning della latenza."""
+    out = {}
+    for name, eng in (("sync", engine), ("async", async_engine.sync_engine if async_engine else None)):
+        if eng is None:
+            continue
+        pool = eng.pool
+        info = {"pool": type(pool).__name__, "status": pool.status()}
+        stats = getattr(pool, "stats", None)
+        if stats is not None:
+            info.update(stats.snapshot())
+        out[name] = info
+    return out
@@ -0,0 +1,267 @@
+"""
+Import massivo di movimenti da CSV / JSON / NDJSON.
+
+    python -m app.importer FILE [FILE ...] [--dry-run] [--user admin]
+
+Colonne/chiavi riconosciute: member (o name), kind (debit|credit, default debit), crocette,
+note, created_at (ISO o d/m/yyyy, opzionale), rule (titolo, opzionale), key (opzionale).
+Se `rule` manca la regola viene proposta da RuleMatcher in base alla nota.
+
+- i nomi sono risolti con una sola query (mappa nome -> id, case-insensitive, più ALIASES);
+- ogni riga ha una chiave di idempotenza: `key` se presente, altrimenti un hash della sorgente
+  (nome del file o dello script) e del contenuto, più il numero di occorrenza nel batch:
+  due righe identiche restano due movimenti, e la stessa riga in due sorgenti diverse non collide;
+  le righe la cui chiave è già in `movements.import_key` vengono saltate, quindi rilanciare
+  lo stesso file non duplica nulla;
+- le righe non valide (data, kind o crocette illeggibili) finiscono in `errors` con il loro numero:
+  con anche un solo errore non si scrive nulla, e il dry-run le elenca tutte;
+- tutti gli insert partono con un solo executemany (multi-row VALUES) in un'unica transazione,
+  e il ledger member_balances viene aggiornato una volta per membro.
+"""
+import argparse
+import csv
+import hashlib
+import json
+import os
+import sys
+from collections import Counter
+from dataclasses import dataclass, field
+from datetime import datetime
+
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+
+from . import balances, stats
+from .database import SessionLocal
+from .migrations import upgrade
+from .models import Member, Movement, Rule, User
+from .rule_matcher import RuleMatcher
+
+ALIASES = {"pie": "pietro"}
+KEY_LOOKUP_CHUNK = 500
+
+
+@dataclass
+class ImportPlan:
+    inserts: list[dict] = field(default_factory=list)
+    duplicates: list[dict] = field(default_factory=list)
+    unknown_members: list[dict] = field(default_factory=list)
+    errors: list[dict] = field(default_factory=list)
+    member_names: dict[int, str] = field(default_factory=dict)
+    rule_titles: dict[int, str] = field(default_factory=dict)
+
+
+# ------------ LETTURA FILE ------------
+def read_rows(path: str) -> list[dict]:
+    ext = os.path.splitext(path)[1].lower()
+    with open(path, encoding="utf-8") as f:
+        if ext == ".csv":
+            return list(csv.DictReader(f))
+        if ext in (".ndjson", ".jsonl"):
+            return [json.loads(line) for line in f if line.strip()]
+        data = json.load(f)
+    return data if isinstance(data, list) else data.get("movements", [])
+
+
+def parse_when(value) -> datetime | None:
+    if not value:
+        return None
+    if isinstance(value, datetime):
+        return value
+    value = str(value).strip()
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        pass
+    try:
+        return datetime.strptime(value, "%d/%m/%Y")
+    except ValueError:
+        raise ValueError(f"data non valida: {value!r}") from None
+
+
+def content_key(source: str, member_id: int, kind: str, crocette: int, note: str, when: datetime | None,
+                occurrence: int) -> str:
+    raw = f"{source}|{member_id}|{kind}|{crocette}|{note.strip().lower()}|{when.isoformat() if when else ''}|{occurrence}"
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+# ------------ PIANO / APPLICAZIONE ------------
+def member_map(db: Session) -> tuple[dict[str, int], dict[int, str]]:
+    members = db.query(Member.id, Member.name).all()
+    by_name = {name.lower(): mid for mid, name in members}
+    for alias, target in ALIASES.items():
+        if target in by_name:
+            by_name.setdefault(alias, by_name[target])
+    return by_name, {mid: name for mid, name in members}
+
+
+def default_rule_resolver(db: Session, fallback_id: int | None = None):
+    # titolo esplicito se presente, altrimenti la regola più simile alla nota (indice costruito una volta);
+    # solo regole attive, come nel form: un import non deve finire su una regola ritirata
+    rules = db.query(Rule.id, Rule.title, Rule.description).filter(Rule.active == True).all()
+    by_title = {t.lower(): rid for rid, t, _ in rules}
+    matcher = RuleMatcher(rules)
+
+    def resolve(row):
+        title = str(row.get("rule") or "").strip().lower()
+        if title:
+            return by_title.get(title)
+        hit = matcher.best(str(row.get("note") or ""))
+        return hit.rule_id if hit else fallback_id
+    return resolve
+
+
+def existing_keys(db: Session, keys: list[str]) -> set[str]:
+    found = set()
+    for i in range(0, len(keys), KEY_LOOKUP_CHUNK):
+        chunk = keys[i:i + KEY_LOOKUP_CHUNK]
+        found.update(k for (k,) in db.query(Movement.import_key).filter(Movement.import_key.in_(chunk)))
+    return found
+
+
+def plan_import(db: Session, rows: list[dict], user_id: int, source: str, rule_for=None,
+                now: datetime | None = None) -> ImportPlan:
+    """Risolve membri e regole e calcola le chiavi, senza scrivere nulla."""
+    now = now or datetime.utcnow()
+    by_name, names = member_map(db)
+    rule_for = rule_for or default_rule_resolver(db)
+    plan = ImportPlan(member_names=names)
+    seen = Counter()
+    candidates = []
+    for i, row in enumerate(rows):
+        name = str(row.get("member") or row.get("name") or "").strip()
+        mid = by_name.get(name.lower())
+        if not mid:
+            plan.unknown_members.append(row)
+            continue
+        kind = str(row.get("kind") or "debit").strip().lower()
+        try:
+            if kind not in ("debit", "credit"):
+                raise ValueError(f"kind non valido: {kind!r}")
+            try:
+                crocette = int(row.get("crocette") or 0)
+            except ValueError:
+                raise ValueError(f"crocette non valide: {row.get('crocette')!r}") from None
+            when = parse_when(row.get("created_at"))
+        except ValueError as e:
+            plan.errors.append({"row": row.get("_row", i), "source": row.get("_source", source), "error": str(e)})
+            continue
+        note = str(row.get("note") or "")
+        base = (mid, kind, crocette, note.strip().lower(), when)
+        key = row.get("key") or content_key(row.get("_source", source), mid, kind, crocette, note, when, seen[base])
+        seen[base] += 1
+        candidates.append({
+            "member_id": mid, "user_id": user_id, "kind": kind, "crocette": crocette, "casse": 0,
+            "note": note, "rule_id": rule_for(row), "created_at": when or now, "import_key": str(key),
+        })
+    dupes = existing_keys(db, [c["import_key"] for c in candidates])
+    batch_keys = set()
+    for c in candidates:
+        if c["import_key"] in dupes or c["import_key"] in batch_keys:
+            plan.duplicates.append(c)
+        else:
+            batch_keys.add(c["import_key"])
+            plan.inserts.append(c)
+    rule_ids = {c["rule_id"] for c in plan.inserts if c["rule_id"]}
+    if rule_ids:
+        plan.rule_titles = dict(db.query(Rule.id, Rule.title).filter(Rule.id.in_(rule_ids)).all())
+    return plan
+
+
+def plan_batch(db: Session, rows: list[dict], user_id: int, batch_id: str,
+               now: datetime | None = None) -> tuple[ImportPlan, list[dict]]:
+    """Righe già strutturate (inserimento multiplo dal sito): membri e regole validati per id.
+
+    Ritorna il piano e la lista degli errori per riga; con errori il piano è vuoto (tutto o niente).
+    """
+    now = now or datetime.utcnow()
+    members = dict(db.query(Member.id, Member.name).all())
+    rules = dict(db.query(Rule.id, Rule.title).filter(Rule.active == True).all())
+    plan = ImportPlan(member_names=members)
+    errors, candidates = [], []
+    for i, row in enumerate(rows):
+        if row["member_id"] not in members:
+            errors.append({"row": i, "error": f"membro {row['member_id']} inesistente"})
+        if row.get("rule_id") is not None and row["rule_id"] not in rules:
+            errors.append({"row": i, "error": f"regola {row['rule_id']} inesistente o non attiva"})
+        if row.get("crocette", 0) < 0:
+            errors.append({"row": i, "error": "crocette negative"})
+        note = (row.get("note") or "").strip()
+        candidates.append({
+            "member_id": row["member_id"], "user_id": user_id, "kind": row["kind"],
+            "crocette": row.get("crocette", 0), "casse": row.get("casse", 0), "note": note,
+            "rule_id": row.get("rule_id"), "created_at": now,
+            "import_key": content_key(f"batch:{batch_id}", row["member_id"], row["kind"], row.get("crocette", 0),
+                                      note, None, i),
+        })
+    if errors:
+        return plan, errors
+    dupes = existing_keys(db, [c["import_key"] for c in candidates])
+    for c in candidates:
+        (plan.duplicates if c["import_key"] in dupes else plan.inserts).append(c)
+    plan.rule_titles = rules
+    return plan, []
+
+
+def apply_import(db: Session, plan: ImportPlan) -> int:
+    """Inserisce il piano con un solo executemany e aggiorna ledger e statistiche. Il commit resta al chiamante."""
+    if plan.errors:
+        raise ValueError(f"{len(plan.errors)} righe non valide: import annullato")
+    if not plan.inserts:
+        return 0
+    db.execute(insert(Movement), plan.inserts)
+    balances.apply_deltas(db, balances.deltas_for(plan.inserts))
+    stats.refresh(db, [(r["member_id"], r["created_at"]) for r in plan.inserts])
+    return len(plan.inserts)
+
+
+def print_plan(plan: ImportPlan, out=sys.stdout):
+    for r in plan.inserts:
+        rule = plan.rule_titles.get(r["rule_id"], "—")
+        print(f"+ {plan.member_names[r['member_id']]:<10} {r['kind']:<6} {r['crocette']:>3}  "
+              f"{r['created_at']:%d/%m/%Y}  {r['note']}  [regola: {rule}]", file=out)
+    for r in plan.duplicates:
+        print(f"= già importato: {plan.member_names[r['member_id']]} - {r['note']} ({r['crocette']} {r['kind']})", file=out)
+    for r in plan.unknown_members:
+        print(f"! membro non trovato, salto: {r}", file=out)
+    for e in plan.errors:
+        print(f"✗ {e['source']} riga {e['row']}: {e['error']}", file=out)
+    print(f"Da inserire: {len(plan.inserts)}  duplicati: {len(plan.duplicates)}  "
+          f"membri sconosciuti: {len(plan.unknown_members)}  errori: {len(plan.errors)}", file=out)
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(prog="python -m app.importer", description="Import massivo di movimenti")
+    ap.add_argument("files", nargs="+", help="file .csv, .json o .ndjson")
+    ap.add_argument("--dry-run", action="store_true", help="mostra gli insert previsti senza scrivere")
+    ap.add_argument("--user", default="admin", help="utente a cui attribuire i movimenti (default admin)")
+    args = ap.parse_args(argv)
+
+    upgrade()
+    # _row: numero della riga di dati nel file (dall'1), per i messaggi di errore
+    rows = [{**r, "_source": os.path.basename(path), "_row": n}
+            for path in args.files for n, r in enumerate(read_rows(path), 1)]
+    db = SessionLocal()
+    try:
+        user = db.query(User).filter(User.username == args.user).first()
+        if not user:
+            print(f"ERRORE: utente '{args.user}' non trovato.")
+            return 1
+        plan = plan_import(db, rows, user.id, source="cli")
+        print_plan(plan)
+        if plan.errors:
+            print("ERRORE: correggi le righe non valide; nessuna modifica.")
+            return 1
+        if args.dry_run:
+            print("Dry run: nessuna modifica.")
+            return 0
+        n = apply_import(db, plan)
+        db.commit()
+        print(f"OK ✔ Inseriti {n} movimenti.")
+        return 0
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
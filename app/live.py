@@ -0,0 +1,99 @@
+"""
+Aggiornamenti in tempo reale della dashboard via Server-Sent Events.
+
+Le rotte di scrittura chiamano `hub.publish(evento, dati)` dopo il commit: il messaggio SSE viene
+serializzato una sola volta e messo nella coda di ogni client collegato, quindi una scrittura costa
+un broadcast e non N render della pagina. Gli ultimi eventi restano in un buffer: la pagina conosce
+il numero di sequenza con cui è stata renderizzata e al collegamento riceve quelli persi nel mezzo;
+se il buffer non basta (o il client è troppo lento) riceve `resync` e ricarica la pagina.
+
+Funziona dentro un singolo processo (uvicorn con un worker, come su Render).
+"""
+import asyncio
+import json
+import os
+from collections import deque
+
+from fastapi.encoders import jsonable_encoder
+
+LIVE_MAX_CLIENTS = int(os.getenv("LIVE_MAX_CLIENTS", "500"))
+LIVE_QUEUE_SIZE = 64
+LIVE_BACKLOG = 256
+HEARTBEAT_SECONDS = 15
+
+
+def format_event(seq: int | None, event: str, data) -> bytes:
+    payload = json.dumps(jsonable_encoder(data), separators=(",", ":"), ensure_ascii=False)
+    head = f"id: {seq}\n" if seq is not None else ""
+    return f"{head}event: {event}\ndata: {payload}\n\n".encode()
+
+
+RESYNC = format_event(None, "resync", {})
+
+
+class LiveHub:
+    def __init__(self, backlog: int = LIVE_BACKLOG):
+        self.seq = 0
+        self._backlog: deque[tuple[int, bytes]] = deque(maxlen=backlog)
+        self._clients: set[asyncio.Queue] = set()
+
+    @property
+    def clients(self) -> int:
+        return len(self._clients)
+
+    def publish(self, event: str, data) -> int:
+        """Da chiamare nel loop (rotte async) dopo il commit."""
+        self.seq += 1
+        message = format_event(self.seq, event, data)
+        self._backlog.append((self.seq, message))
+        for q in list(self._clients):
+            try:
+                q.put_nowait(message)
+            except asyncio.QueueFull:
+                # client che non legge: lo scolleghiamo, al ritorno farà resync
+                self._clients.discard(q)
+        return self.seq
+
+    def subscribe(self, since: int | None) -> asyncio.Queue | None:
+        if len(self._clients) >= LIVE_MAX_CLIENTS:
+            return None
+        q: asyncio.Queue = asyncio.Queue(maxsize=LIVE_QUEUE_SIZE)
+        if since is not None and since < self.seq:
+            missed = [m for s, m in self._backlog if s > since]
+            oldest = self._backlog[0][0] if self._backlog else self.seq + 1
+            if oldest > since + 1 or len(missed) >= LIVE_QUEUE_SIZE:
+                q.put_nowait(RESYNC)  # persi troppi eventi: meglio ricaricare
+            else:
+                for m in missed:
+                    q.put_nowait(m)
+        self._clients.add(q)
+        return q
+
+    def unsubscribe(self, q: asyncio.Queue):
+        self._clients.discard(q)
+
+    def is_subscribed(self, q: asyncio.Queue) -> bool:
+        return q in self._clients
+
+
+hub = LiveHub()
+
+
+async def stream(request, q: asyncio.Queue):
+    """Generatore per StreamingResponse: eventi dalla coda, un commento di heartbeat ogni tanto."""
+    try:
+        yield b"retry: 3000\n\n"
+        while True:
+            try:
+                message = await asyncio.wait_for(q.get(), timeout=HEARTBEAT_SECONDS)
+            except asyncio.TimeoutError:
+                if await request.is_disconnected():
+                    break
+                yield b": ping\n\n"
+                continue
+            yield message
+            if q.empty() and not hub.is_subscribed(q):
+                yield RESYNC  # scollegato perché troppo lento
+                break
+    finally:
+        hub.unsubscribe(q)
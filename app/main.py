@@ -1,17 +1,30 @@
 from fastapi import FastAPI, Depends, Request, Response, status, Form, HTTPException, Query
-from fastapi.responses import HTMLResponse, RedirectResponse, PlainTextResponse
-from fastapi.staticfiles import StaticFiles
+from fastapi.responses import HTMLResponse, RedirectResponse, PlainTextResponse, StreamingResponse, JSONResponse
+from fastapi.encoders import jsonable_encoder
 from fastapi.templating import Jinja2Templates
-from sqlalchemy.orm import Session
-from datetime import datetime
-import os, re
-
-from .database import Base, engine, get_db
-from .models import User, Member, Rule, Movement, BagheroneScore
-from .auth import create_access_token, verify_password, get_current_user
-
-from jose import jwt, JWTError
-from .auth import SECRET_KEY, ALGORITHM
+from starlette.concurrency import run_in_threadpool
+from sqlalchemy import func, case, or_, and_
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session, joinedload
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+import os, csv, io, json, hashlib, hmac, uuid
+from collections import OrderedDict
+import jinja2
+from urllib.parse import urlencode
+
+from .database import engine, get_async_db, run_db, SessionLocal, pool_stats, current_data_version
+from .models import User, Member, Rule, Movement, BagheroneScore, MemberBalance, Season
+from . import assets, balances, calendar_store, compression, metrics, seasons, stats
+from .live import hub, stream as live_stream
+from .migrations import check_current
+from .importer import plan_batch, apply_import
+from .rule_matcher import RuleMatcher
+from .auth import (
+    create_access_token, verify_password_async, get_current_user, decode_token, resolve_user, token_is_fresh, AuthUser,
+    PasswordPoolBusy, begin_login_attempt, end_login_attempt,
+)
+from .schemas import MovementBatchIn, MovementOut, MemberBalanceOut, RuleOut, MovementPage, CalendarEventOut, BagheroneOut
 
 # se hai lo script di seed in root, lascia pure così:
 try:
@@ -19,119 +32,113 @@ try:
 except Exception:
     seed_rules_main = None  # non bloccare l'app se manca nel container
 
-# ------------ CONFIG PATHS ------------
-APP_DIR = os.path.dirname(__file__)
-DATA_DIR = os.path.join(APP_DIR, "data")
-CAL_TXT = os.path.join(DATA_DIR, "calendar.txt")
+# ------------ CONFIG STORICO ------------
+STORICO_PAGE_SIZE = int(os.getenv("STORICO_PAGE_SIZE", "100"))
+STORICO_MAX_PAGE_SIZE = 500
+
+# Dietro un reverse proxy fidato (Render) l'IP client arriva in X-Forwarded-For
+TRUST_FORWARDED_FOR = os.getenv("TRUST_FORWARDED_FOR", "0").lower() in ("1", "true", "yes")
+
+# /metrics è chiuso di default: serve "Authorization: Bearer <METRICS_TOKEN>" (per lo scraper)
+# oppure la sessione di un admin
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")
 
 # ------------ FASTAPI APP ------------
 app = FastAPI(title="Dashboard Crocette")
-app.mount("/static", StaticFiles(directory="app/static"), name="static")
+# file con hash (build_assets.py) immutabili, varianti .br/.gz, ETag e Range
+app.mount("/static", assets.AssetFiles(directory="app/static"), name="static")
+# l'ultimo aggiunto è il più esterno: le metriche vedono anche il tempo di compressione
+app.add_middleware(compression.CompressionMiddleware)
+app.add_middleware(metrics.MetricsMiddleware)
+
+class TimedTemplate(jinja2.Template):
+    # il render finisce nel segmento "template" di Server-Timing e /metrics
+    def render(self, *args, **kwargs):
+        with metrics.timed("template"):
+            html = super().render(*args, **kwargs)
+        return compression.minify_html(html) if compression.HTML_MINIFY else html
+
 templates = Jinja2Templates(directory="app/templates")
-Base.metadata.create_all(bind=engine)
-
-# ------------ UTILS ------------
-MONTHS_IT = {
-    "gen":1, "gennaio":1, "feb":2, "febbraio":2, "mar":3, "marzo":3, "apr":4, "aprile":4,
-    "mag":5, "maggio":5, "giu":6, "giugno":6, "lug":7, "luglio":7, "ago":8, "agosto":8,
-    "set":9, "sett":9, "settembre":9, "ott":10, "ottobre":10, "nov":11, "novembre":11,
-    "dic":12, "dicembre":12,
-}
-
-EMOJIS = {"paste":"🍕", "home":"🏠", "away":"✈️", "birthday":"🎂"}
-EMOJI_SET = set(EMOJIS.values())
-
-def get_optional_user(request: Request, db: Session):
-    token = request.cookies.get("access_token")
-    if not token:
-        return None
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        username: str = payload.get("sub")
-        if not username:
-            return None
-    except JWTError:
+templates.env.template_class = TimedTemplate
+templates.env.globals["asset"] = assets.url
+check_current(engine)
+
+async def get_optional_user(request: Request, db, authorize: bool = False):
+    payload = decode_token(request.cookies.get("access_token"))
+    if payload is None:
         return None
-    return db.query(User).filter(User.username == username, User.is_active == True).first()
+    # il ruolo nel token basta per la navbar: nessuna query per le pagine pubbliche. Se la pagina
+    # decide cosa permettere o mostrare (authorize=True) ruolo e is_active vengono dal DB: il token
+    # vive 12 ore e non sa di retrocessioni o disattivazioni fatte da CLI o da altre istanze.
+    if not authorize and payload.get("role") and token_is_fresh(payload):
+        return AuthUser(None, payload["sub"], payload["role"])
+    return await resolve_user(db, payload)
+
+# Le cache in-process (totali, indice delle regole, HTML anonimo, ETag delle API) sono legate alla
+# versione dei dati nel DB (current_data_version), che vede anche le scritture di CLI, script e altre istanze.
+_totals_cache: tuple[int, dict] | None = None
 
 def aggregate(db: Session):
-    debits = db.query(Movement).filter(Movement.kind == "debit").all()
-    credits = db.query(Movement).filter(Movement.kind == "credit").all()
-    deb_croc = sum(m.crocette for m in debits)
-    cre_croc = sum(m.crocette for m in credits)
-    return {
+    # chiave = versione dei dati nel DB: vale anche per le scritture di CLI, script e altre istanze
+    global _totals_cache
+    version = current_data_version(db)
+    cached = _totals_cache
+    if cached and cached[0] == version:
+        return cached[1]
+    # i saldi iniziali riportati da una chiusura di stagione (stats.COUNTED) non sono crocette prese o
+    # pagate in questa stagione, ma restano nel "da pagare"
+    def total(kind, *where):
+        return func.coalesce(func.sum(case((and_(Movement.kind == kind, *where), Movement.crocette), else_=0)), 0)
+    deb_croc, cre_croc, deb_all, cre_all = db.query(
+        total("debit", stats.COUNTED), total("credit", stats.COUNTED), total("debit"), total("credit"),
+    ).one()
+    totals = {
         "crocette_prese_total": deb_croc,
         "crocette_pagate": cre_croc,
-        "crocette_da_pagare": max(0, deb_croc - cre_croc),
+        "crocette_da_pagare": max(0, deb_all - cre_all),
     }
-
-# ------------ CALENDAR (SOLO TESTO LOCALE) ------------
-DEFAULT_CALENDAR = """\
-# Esempi (una riga per evento). Modifica liberamente:
-# 2025-10-14 🍕 Dani
-# 2025-10-18 🏠 Scanzo vs XYZ
-# 2025-10-25 ✈️ Trasferta vs ABC
-# 2025-11-02 🎂 Mirco
-"""
-
-def ensure_data_dir():
-    os.makedirs(DATA_DIR, exist_ok=True)
-
-def parse_date_any(s: str):
-    s = s.strip().lower()
-    m = re.search(r"(\d{4})[-/.](\d{1,2})[-/.](\d{1,2})", s)
-    if m:
-        y, mo, d = map(int, m.groups())
-        return datetime(y, mo, d)
-    m = re.search(r"(\d{1,2})[-/.](\d{1,2})[-/.](\d{2,4})", s)
-    if m:
-        d, mo, y = m.groups()
-        d, mo, y = int(d), int(mo), int(y)
-        if y < 100: y += 2000
-        return datetime(y, mo, d)
-    m = re.search(r"(\d{1,2})\s+([a-zà]+)(?:\s+(\d{4}))?", s)
-    if m:
-        d = int(m.group(1)); mm = m.group(2).strip("."); y = m.group(3)
-        mo = MONTHS_IT.get(mm, None)
-        if mo:
-            if y: y = int(y)
-            else: y = 2025 if mo >= 8 else 2026
-            return datetime(y, mo, d)
-    return None
-
-def normalize_line(line: str):
-    return re.sub(r"\s+", " ", line).strip()
-
-def parse_calendar_text(text: str):
-    ev = []
-    for raw in text.splitlines():
-        if not raw.strip() or raw.strip().startswith("#"):
-            continue
-        line = normalize_line(raw)
-        found = next((e for e in EMOJI_SET if e in line), None)
-        if not found:
-            continue
-        d = parse_date_any(line) or parse_date_any(line.split(found, 1)[0])
-        if d is None:
-            continue
-        after = line.split(found, 1)[1].strip(" -:—").strip()
-        typ = "paste" if found == EMOJIS["paste"] else ("home" if found == EMOJIS["home"] else ("away" if found == EMOJIS["away"] else "birthday"))
-        ev.append({"date": d, "type": typ, "who": after, "emoji": found, "raw": raw})
-    ev.sort(key=lambda x: x["date"])
-    return ev
-
-def load_calendar_text():
-    ensure_data_dir()
-    if not os.path.exists(CAL_TXT):
-        with open(CAL_TXT, "w", encoding="utf-8") as f:
-            f.write(DEFAULT_CALENDAR)
-    with open(CAL_TXT, "r", encoding="utf-8") as f:
-        return f.read()
-
-def save_calendar_text(text: str):
-    ensure_data_dir()
-    with open(CAL_TXT, "w", encoding="utf-8") as f:
-        f.write(text or "")
+    _totals_cache = (version, totals)
+    return totals
+
+# --------- SALDI helper ----------
+def member_rows(db: Session, member_ids=None):
+    # Saldi per membro letti dal ledger member_balances (LEFT JOIN: compaiono anche i membri senza movimenti)
+    q = (
+        db.query(Member.id, Member.name,
+                 func.coalesce(MemberBalance.crocette_prese, 0),
+                 func.coalesce(MemberBalance.crocette_pagate, 0),
+                 MemberBalance.last_movement_at)
+        .outerjoin(MemberBalance, MemberBalance.member_id == Member.id)
+    )
+    if member_ids is not None:
+        q = q.filter(Member.id.in_(member_ids))
+    ledger = q.all()
+    rows = []
+    for mid, name, deb_croc, cre_croc, last in ledger:
+        rows.append({
+            "id": mid,
+            "name": name,
+            "crocette_prese": deb_croc,
+            "crocette_pagate": cre_croc,
+            "crocette_da_pagare": max(0, deb_croc - cre_croc),
+            "balance": cre_croc - deb_croc,
+            "last": last,
+        })
+    return rows
+
+# --------- REGOLE: indice per i suggerimenti ----------
+_matcher_cache: tuple[int, RuleMatcher] | None = None
+
+def get_rule_matcher(db: Session) -> RuleMatcher:
+    # ricostruito solo dopo una scrittura (nuove regole, reseed), anche se fatta da un altro processo
+    global _matcher_cache
+    version = current_data_version(db)
+    cached = _matcher_cache
+    if cached and cached[0] == version:
+        return cached[1]
+    matcher = RuleMatcher(db.query(Rule.id, Rule.title, Rule.description).filter(Rule.active == True).all())
+    _matcher_cache = (version, matcher)
+    return matcher
 
 # --------- BAGHERONE helper ----------
 def get_or_create_bagherone(db: Session) -> BagheroneScore:
@@ -144,62 +151,88 @@ def get_or_create_bagherone(db: Session) -> BagheroneScore:
     return row
 
 # ------------ ROUTES ------------
-@app.get("/", response_class=HTMLResponse)
-async def index(request: Request, db: Session = Depends(get_db)):
+def index_data(db: Session) -> dict:
+    # bagherone per primo: se crea la riga fa commit, e non deve scadere gli oggetti già letti
+    bagherone = get_or_create_bagherone(db)
     rules = db.query(Rule).filter(Rule.active == True).all()
-    members = db.query(Member).all()
-
-    rows = []
-    # Eseguiamo il calcolo aggregando i dati per ogni membro
-    for m in members:
-        # Pre-carichiamo i movimenti per evitare il problema N+1 (anche se sqlite/neon lo gestiscono, è meglio essere espliciti in Python con list comprehension)
-        m_movements = m.movements
-        deb_croc = sum(x.crocette for x in m_movements if x.kind == "debit")
-        cre_croc = sum(x.crocette for x in m_movements if x.kind == "credit")
-        rows.append({
-            "id": m.id,
-            "name": m.name,
-            "crocette_prese": deb_croc,
-            "crocette_pagate": cre_croc,
-            "crocette_da_pagare": max(0, deb_croc - cre_croc),
-            "balance": cre_croc - deb_croc,
-            "last": max([x.created_at for x in m_movements], default=None)
-        })
-
+    rows = member_rows(db)
     totals = aggregate(db)
     now = datetime.now()
     month_start = datetime(now.year, now.month, 1)
     last_month = (
         db.query(Movement)
+        .options(joinedload(Movement.member), joinedload(Movement.rule))
         .filter(Movement.created_at >= month_start)
         .order_by(Movement.created_at.desc())
         .limit(50)
         .all()
     )
-    latest_movement = db.query(Movement).order_by(Movement.created_at.desc()).first()
-    user = get_optional_user(request, db)
-
-    cal_text = load_calendar_text()
-    events = parse_calendar_text(cal_text)
-    upcoming_pastes = [e for e in events if e["type"] == "paste" and e["date"] >= now][:5]
-    matches = [e for e in events if e["type"] in ("home", "away") and e["date"] >= now]
-    next_match = matches[0] if matches else None
-
-    bagherone = get_or_create_bagherone(db)
-
-    return templates.TemplateResponse("index.html", {
-        "request": request,
+    latest_movement = (
+        db.query(Movement)
+        .options(joinedload(Movement.member), joinedload(Movement.rule))
+        .order_by(Movement.created_at.desc())
+        .first()
+    )
+    return {
         "rules": rules,
         "rows": rows,
         "totals": totals,
         "last_month": last_month,
         "latest_movement": latest_movement,
+        "bagherone": bagherone,
+        "upcoming_pastes": calendar_store.upcoming(db, "paste", now, 5),
+        "next_match": next(iter(calendar_store.upcoming(db, "match", now, 1)), None),
+    }
+
+# Cache dell'HTML della dashboard per i visitatori anonimi. La chiave cambia a ogni scrittura
+# (versione dei dati nel DB, compreso il salvataggio del calendario) e a mezzanotte (prossime
+# paste/partita, "questo mese"). La query string non ne fa parte: il template non la legge, e
+# `/?x=<caso>` non deve poter creare voci nuove. Oltre PAGE_CACHE_MAX esce la meno usata (LRU).
+# Per ogni chiave si tengono anche le varianti br/gzip, compresse una volta sola al primo client che
+# le chiede: gli hit non ripassano dal compressore del middleware.
+PAGE_CACHE_MAX = 8
+_page_cache: "OrderedDict[tuple, dict[str, bytes]]" = OrderedDict()
+
+def cached_page(request: Request, variants: dict[str, bytes]) -> HTMLResponse:
+    body = variants["identity"]
+    coding = compression.choose_encoding(request.headers.get("accept-encoding", ""))
+    if coding is None or len(body) < compression.COMPRESS_MIN_BYTES:
+        return HTMLResponse(body)
+    if coding not in variants:
+        variants[coding] = compression.encode(body, coding, "/")
+    return HTMLResponse(variants[coding], headers={"Content-Encoding": coding, "Vary": "Accept-Encoding"})
+
+@app.get("/", response_class=HTMLResponse)
+async def index(request: Request, db = Depends(get_async_db)):
+    now = datetime.now()
+    # letto prima dei dati: gli eventi pubblicati durante il render vengono rigiocati (sono idempotenti)
+    live_seq = hub.seq
+    anonymous = decode_token(request.cookies.get("access_token")) is None
+    if anonymous:
+        cache_key = (await run_db(db, current_data_version), now.date())
+        variants = _page_cache.get(cache_key)
+        if variants is not None:
+            _page_cache.move_to_end(cache_key)
+            return cached_page(request, variants)
+
+    data = await run_db(db, index_data)
+    user = await get_optional_user(request, db, authorize=True)
+    # il testo serve solo all'editor dell'admin
+    cal_text = await run_db(db, calendar_store.source_text) if user and user.role == "admin" else ""
+
+    resp = templates.TemplateResponse("index.html", {
+        "request": request,
+        **data,
         "user": user,
         "calendar_text": cal_text,
-        "upcoming_pastes": upcoming_pastes,
-        "next_match": next_match,
-        "bagherone": bagherone,
+        "live_seq": live_seq,
     })
+    if anonymous and user is None:
+        _page_cache[cache_key] = variants = {"identity": resp.body}
+        while len(_page_cache) > PAGE_CACHE_MAX:
+            _page_cache.popitem(last=False)
+        return cached_page(request, variants)
+    return resp
 
 # ---- reseed (se presente) ----
 @app.post("/admin/reseed")
@@ -208,73 +241,313 @@ async def admin_reseed(user: User = Depends(get_current_user)):
         raise HTTPException(status_code=403, detail="Solo admin")
     if not seed_rules_main:
         raise HTTPException(status_code=500, detail="seed_rules_2025_26.py non disponibile nel container")
-    seed_rules_main()
+    await run_in_threadpool(seed_rules_main)
+    hub.publish("resync", {})
     return RedirectResponse("/?reseed=ok", status_code=303)
 
 # ---- storico ----
-@app.get("/storico", response_class=HTMLResponse)
-async def storico(request: Request,
-                  kind: str = "all",
-                  member_id: str | None = Query(None),
-                  db: Session = Depends(get_db)):
-    user = get_optional_user(request, db)
-    members = db.query(Member).order_by(Member.name).all()
-
+def paginate_movements(db: Session, filters, cursor: str | None, limit: int | None):
+    # Paginazione keyset su (created_at, id) decrescente
+    page_size = max(1, min(limit or STORICO_PAGE_SIZE, STORICO_MAX_PAGE_SIZE))
+    q = (
+        db.query(Movement)
+        .options(joinedload(Movement.member), joinedload(Movement.rule))
+        .filter(*filters)
+        .order_by(Movement.created_at.desc(), Movement.id.desc())
+    )
+    after = decode_cursor(cursor)
+    if after:
+        c_at, c_id = after
+        q = q.filter(or_(Movement.created_at < c_at,
+                         and_(Movement.created_at == c_at, Movement.id < c_id)))
+    moves = q.limit(page_size + 1).all()
+    next_cursor = encode_cursor(moves[page_size - 1]) if len(moves) > page_size else None
+    return moves[:page_size], next_cursor, page_size, after
+
+def encode_cursor(mv: Movement) -> str:
+    return f"{mv.created_at.isoformat()}_{mv.id}"
+
+def movement_filters(kind: str, member_id: str | None):
     # Gestione member_id vuoto (stringa "" dal form HTML)
     m_id = None
     if member_id and member_id.strip().isdigit():
         m_id = int(member_id)
 
-    q = db.query(Movement).order_by(Movement.created_at.desc())
     kind = kind.lower().strip()
+    filters = []
     if kind in ("debit", "credit"):
-        q = q.filter(Movement.kind == kind)
+        filters.append(Movement.kind == kind)
     if m_id:
-        q = q.filter(Movement.member_id == m_id)
+        filters.append(Movement.member_id == m_id)
+    return kind, m_id, filters
 
-    moves = q.all()
-    total_crocette = sum(m.crocette for m in moves)
+def decode_cursor(cursor: str | None):
+    # cursore non valido -> prima pagina
+    if not cursor:
+        return None
+    try:
+        ts, mid = cursor.rsplit("_", 1)
+        return datetime.fromisoformat(ts), int(mid)
+    except ValueError:
+        return None
+
+@app.get("/storico", response_class=HTMLResponse)
+async def storico(request: Request,
+                  kind: str = "all",
+                  member_id: str | None = Query(None),
+                  cursor: str | None = Query(None),
+                  limit: int | None = Query(None),
+                  db = Depends(get_async_db)):
+    user = await get_optional_user(request, db)
+    kind, m_id, filters = movement_filters(kind, member_id)
+
+    def load(db: Session):
+        members = db.query(Member).order_by(Member.name).all()
+        # Totali sull'intero filtro, indipendenti dalla pagina
+        moves_count, total_crocette = (
+            db.query(func.count(Movement.id), func.coalesce(func.sum(Movement.crocette), 0))
+            .filter(*filters)
+            .one()
+        )
+        return members, moves_count, total_crocette, *paginate_movements(db, filters, cursor, limit)
+
+    members, moves_count, total_crocette, moves, next_cursor, page_size, after = await run_db(db, load)
 
     return templates.TemplateResponse("history.html", {
         "request": request,
         "moves": moves,
+        "moves_count": moves_count,
         "members": members,
         "kind": kind,
         "member_id": m_id, # Usiamo l'ID numerico per i logica template se necessario
         "member_id_str": member_id, # La stringa originale per il selettore
         "total": total_crocette,
+        "cursor": cursor if after else None,
+        "next_cursor": next_cursor,
+        "page_size": page_size,
         "user": user,
     })
 
+# ---- export storico (CSV / NDJSON in streaming) ----
+EXPORT_COLUMNS = ["id", "created_at", "member", "kind", "crocette", "casse", "rule", "note"]
+EXPORT_BATCH = 500
+
+def iter_export_rows(filters):
+    # sessione dedicata: quella di get_async_db viene chiusa prima che lo stream finisca
+    db = SessionLocal()
+    try:
+        q = (
+            db.query(Movement.id, Movement.created_at, Member.name, Movement.kind,
+                     Movement.crocette, Movement.casse, Rule.title, Movement.note)
+            .join(Member, Member.id == Movement.member_id)
+            .outerjoin(Rule, Rule.id == Movement.rule_id)
+            .filter(*filters)
+            .order_by(Movement.created_at.desc(), Movement.id.desc())
+            .execution_options(stream_results=True, yield_per=EXPORT_BATCH)
+        )
+        for row in q:
+            yield row
+    finally:
+        db.close()
+
+def export_csv(rows):
+    buf = io.StringIO()
+    w = csv.writer(buf)
+    w.writerow(EXPORT_COLUMNS)
+    for i, r in enumerate(rows, 1):
+        w.writerow([r[0], r[1].isoformat() if r[1] else "", *r[2:6], r[6] or "", r[7] or ""])
+        if i % EXPORT_BATCH == 0:
+            yield buf.getvalue()
+            buf.seek(0); buf.truncate()
+    yield buf.getvalue()
+
+def export_ndjson(rows):
+    chunk = []
+    for r in rows:
+        d = dict(zip(EXPORT_COLUMNS, r))
+        d["created_at"] = r[1].isoformat() if r[1] else None
+        chunk.append(json.dumps(d, ensure_ascii=False))
+        if len(chunk) >= EXPORT_BATCH:
+            yield "\n".join(chunk) + "\n"
+            chunk = []
+    if chunk:
+        yield "\n".join(chunk) + "\n"
+
+@app.get("/storico/export")
+async def storico_export(kind: str = "all",
+                         member_id: str | None = Query(None),
+                         format: str = Query("csv", pattern="^(csv|ndjson)$")):
+    kind, _, filters = movement_filters(kind, member_id)
+    rows = iter_export_rows(filters)
+    stamp = datetime.now().strftime("%Y%m%d")
+    # nel nome del file solo valori validati: il parametro grezzo può contenere virgolette o non-latin-1
+    label = kind if kind in ("debit", "credit") else "all"
+    if format == "ndjson":
+        body, media, ext = export_ndjson(rows), "application/x-ndjson", "ndjson"
+    else:
+        body, media, ext = export_csv(rows), "text/csv; charset=utf-8", "csv"
+    return StreamingResponse(body, media_type=media, headers={
+        "Content-Disposition": f'attachment; filename="movimenti_{label}_{stamp}.{ext}"',
+    })
+
+# ---- stagioni chiuse ----
+@app.get("/stagioni", response_class=HTMLResponse)
+async def stagioni(request: Request, id: int | None = Query(None), db = Depends(get_async_db)):
+    def load(db: Session):
+        all_seasons = db.query(Season).order_by(Season.ended_at.desc()).all()
+        current = next((x for x in all_seasons if x.id == id), None) if id else (all_seasons[0] if all_seasons else None)
+        return all_seasons, current, seasons.season_summary(db, current.id) if current else None
+    all_seasons, current, summary = await run_db(db, load)
+    user = await get_optional_user(request, db)
+    return templates.TemplateResponse("seasons.html", {
+        "request": request, "user": user, "seasons": all_seasons, "season": current, "summary": summary,
+    })
+
+@app.post("/admin/season/close")
+async def close_season(user: User = Depends(get_current_user), db = Depends(get_async_db),
+                       name: str = Form(...), until: str = Form("")):
+    if user.role != "admin":
+        raise HTTPException(status_code=403, detail="Solo admin")
+    try:
+        until_dt = datetime.strptime(until, "%Y-%m-%d") if until else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Data non valida (YYYY-MM-DD)")
+
+    def write(db: Session):
+        season = seasons.close_season(db, name, user.id, until_dt)
+        db.commit()
+        return season.id
+    try:
+        season_id = await run_db(db, write)
+    except seasons.InvalidUntil as e:
+        # data nel futuro o non dopo la fine della stagione precedente
+        raise HTTPException(status_code=400, detail=str(e))
+    except ValueError as e:
+        return RedirectResponse(f"/admin?{urlencode({'season_err': str(e)})}", status_code=303)
+    hub.publish("resync", {})
+    return RedirectResponse(f"/stagioni?id={season_id}", status_code=303)
+
+# ---- statistiche (tabella precalcolata, vedi app/stats.py) ----
+@app.get("/statistiche", response_class=HTMLResponse)
+async def statistiche(request: Request, db = Depends(get_async_db)):
+    data = await run_db(db, lambda s: {"top_rules": stats.top_rules(s), "ranking": stats.ranking(s)})
+    user = await get_optional_user(request, db)
+    return templates.TemplateResponse("stats.html", {"request": request, "user": user, **data})
+
 # ---- calendario ----
 @app.post("/calendar")
-async def save_calendar(request: Request, user: User = Depends(get_current_user), text: str = Form(...)):
+async def save_calendar(request: Request, user: User = Depends(get_current_user), db = Depends(get_async_db),
+                        text: str = Form(...)):
     if user.role != "admin":
         return RedirectResponse("/", status_code=302)
-    save_calendar_text(text)
+
+    def write(db: Session):
+        calendar_store.save(db, text)
+        db.commit()
+    await run_db(db, write)
+    _ics_cache.clear()
+    hub.publish("resync", {})
     return RedirectResponse("/#saldi?calendar=ok", status_code=302)
 
+# il testo salvato dall'admin, riletto solo quando cambia calendar_source.updated_at
+# (anche se il salvataggio arriva da un'altra istanza o da `python -m app.calendar_store load`)
+_cal_txt_cache: tuple[datetime, str] | None = None
+
 @app.get("/calendar.txt", response_class=PlainTextResponse)
-async def calendar_txt():
-    txt = load_calendar_text()
-    return PlainTextResponse(txt or "", media_type="text/plain; charset=utf-8")
+async def calendar_txt(db = Depends(get_async_db)):
+    global _cal_txt_cache
+    def load(db: Session):
+        stamp = calendar_store.updated_at(db)
+        cached = _cal_txt_cache
+        if cached and cached[0] == stamp:
+            return cached
+        return stamp, calendar_store.source_text(db)
+    _cal_txt_cache = cached = await run_db(db, load)
+    return PlainTextResponse(cached[1], media_type="text/plain; charset=utf-8")
+
+# Feed iCalendar per i telefoni: generato una volta per versione del calendario (calendar_source.updated_at,
+# una lookup per chiave primaria che vede anche i salvataggi di altre istanze e della CLI) e per `who`,
+# poi servito dalla memoria; i poll condizionali ricevono 304. Oltre ICS_CACHE_MAX esce il meno usato.
+# Come per la home, accanto al body si tengono le varianti br/gzip, compresse una volta sola.
+ICS_CACHE_MAX = 64
+_ics_cache: "OrderedDict[tuple[str, datetime | None], tuple[dict[str, bytes], str, datetime]]" = OrderedDict()
+
+def build_ics(db: Session, who: str, stamp: datetime | None) -> tuple[dict[str, bytes], str, datetime]:
+    evs = calendar_store.events(db, who or None)
+    stamp = stamp or datetime.utcnow()
+    body = calendar_store.to_ics(evs, stamp, f"Crocette — {who.title()}" if who else "Crocette").encode()
+    etag = '"' + hashlib.sha1(f"{stamp.isoformat()}|".encode() + body).hexdigest()[:20] + '"'
+    return {"identity": body}, etag, stamp.replace(microsecond=0, tzinfo=timezone.utc)
+
+@app.get("/calendar.ics")
+async def calendar_ics(request: Request, who: str = Query("", max_length=80), db = Depends(get_async_db)):
+    key = (" ".join(who.split()).lower(), await run_db(db, calendar_store.updated_at))
+    cached = _ics_cache.get(key)
+    if cached is None:
+        cached = await run_db(db, build_ics, *key)
+        _ics_cache[key] = cached
+        while len(_ics_cache) > ICS_CACHE_MAX:
+            _ics_cache.popitem(last=False)
+    else:
+        _ics_cache.move_to_end(key)
+    variants, etag, last_modified = cached
+    body = variants["identity"]
+    coding = compression.choose_encoding(request.headers.get("accept-encoding", ""))
+    if len(body) < compression.COMPRESS_MIN_BYTES:
+        coding = None
+    headers = {"ETag": "W/" + etag if coding else etag,  # stessa risorsa, byte diversi (come fa il middleware)
+               "Last-Modified": format_datetime(last_modified, usegmt=True),
+               "Cache-Control": "public, max-age=300"}
+    if etag_matches(request, etag) or not_modified_since(request, last_modified):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={**headers, "Vary": "Accept-Encoding"})
+    if coding:
+        if coding not in variants:
+            variants[coding] = compression.encode(body, coding, "/calendar.ics")
+        body = variants[coding]
+        # il middleware lascia passare le risposte già codificate; sulle altre aggiunge Vary da sé
+        headers.update({"Content-Encoding": coding, "Vary": "Accept-Encoding"})
+    return Response(body, media_type="text/calendar; charset=utf-8", headers=headers)
 
 # ---- login/logout/movements ----
 @app.get("/login", response_class=HTMLResponse)
-async def login_page(request: Request, db: Session = Depends(get_db)):
-    user = get_optional_user(request, db)
+async def login_page(request: Request, db = Depends(get_async_db)):
+    user = await get_optional_user(request, db)
     return templates.TemplateResponse("login.html", {"request": request, "user": user})
 
+def client_ip(request: Request) -> str:
+    # dietro al proxy di Render l'IP reale è l'ultimo aggiunto a X-Forwarded-For
+    if TRUST_FORWARDED_FOR:
+        fwd = request.headers.get("x-forwarded-for")
+        if fwd:
+            return fwd.split(",")[-1].strip()
+    return request.client.host if request.client else "-"
+
+def login_throttled(request: Request, wait: float):
+    return templates.TemplateResponse("login.html", {"request": request, "user": None, "throttled": True},
+                                      status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                                      headers={"Retry-After": str(max(1, int(wait + 0.999)))})
+
 @app.post("/login")
-async def login(response: Response,
+async def login(request: Request,
                 username: str = Form(...),
                 password: str = Form(...),
                 next: str | None = Form(None),
-                db: Session = Depends(get_db)):
-    user = db.query(User).filter(User.username == username).first()
-    if not user or not verify_password(password, user.password_hash):
+                db = Depends(get_async_db)):
+    ip = client_ip(request)
+    # il gettone si consuma prima di bcrypt: i tentativi concorrenti non passano tutti il controllo
+    wait = begin_login_attempt(username, ip)
+    if wait > 0:
+        return login_throttled(request, wait)
+    user = await run_db(db, lambda s: s.query(User).filter(User.username == username).first())
+    try:
+        ok = bool(user) and await verify_password_async(password, user.password_hash)
+    except PasswordPoolBusy:
+        end_login_attempt(username, ip, None)
+        return login_throttled(request, 1)
+    end_login_attempt(username, ip, ok)
+    if not ok:
         return RedirectResponse("/login?err=1", status_code=status.HTTP_302_FOUND)
-    token = create_access_token({"sub": user.username})
+    token = create_access_token({"sub": user.username, "role": user.role})
     target = next if (next and next.startswith("/")) else "/"
     resp = RedirectResponse(url=target, status_code=status.HTTP_302_FOUND)
     resp.set_cookie("access_token", token, httponly=True, max_age=60*60*12, samesite="lax")
@@ -287,28 +560,129 @@ async def logout(response: Response):
     return response
 
 @app.get("/movements", response_class=HTMLResponse)
-async def movements_page(request: Request, db: Session = Depends(get_db)):
-    user = get_optional_user(request, db)
+async def movements_page(request: Request, db = Depends(get_async_db)):
+    user = await get_optional_user(request, db, authorize=True)
     if not user:
         return RedirectResponse("/login?next=/movements", status_code=302)
-    members = db.query(Member).order_by(Member.name).all()
-    rules = db.query(Rule).filter(Rule.active == True).order_by(Rule.title).all()
+    members, rules = await run_db(db, lambda s: (
+        s.query(Member).order_by(Member.name).all(),
+        s.query(Rule).filter(Rule.active == True).order_by(Rule.title).all(),
+    ))
     return templates.TemplateResponse("movements.html", {"request": request, "members": members, "rules": rules, "user": user})
 
+# ---- aggiornamenti live (SSE) ----
+def live_movement(mv: Movement | None) -> dict | None:
+    if mv is None:
+        return None
+    return {
+        "id": mv.id, "member_id": mv.member_id, "member": mv.member.name, "kind": mv.kind,
+        "crocette": mv.crocette, "rule": mv.rule.title if mv.rule else None, "note": mv.note,
+        "created_at": mv.created_at,
+    }
+
+def live_delta(db: Session, member_ids, movement_ids=()) -> dict:
+    """Quello che cambia in dashboard dopo dei movimenti: saldi dei membri toccati, totali, ultimo saldo."""
+    latest = (
+        db.query(Movement)
+        .options(joinedload(Movement.member), joinedload(Movement.rule))
+        .order_by(Movement.created_at.desc())
+        .first()
+    )
+    out = {"members": member_rows(db, member_ids), "totals": aggregate(db), "latest": live_movement(latest)}
+    if movement_ids:
+        moves = (
+            db.query(Movement)
+            .options(joinedload(Movement.member), joinedload(Movement.rule))
+            .filter(Movement.id.in_(movement_ids))
+            .order_by(Movement.created_at, Movement.id)
+            .all()
+        )
+        out["movements"] = [live_movement(mv) for mv in moves]
+    return out
+
+@app.get("/events")
+async def live_events(request: Request, since: int | None = Query(None)):
+    # EventSource alla riconnessione manda Last-Event-ID: ha la precedenza sul numero della pagina
+    last_id = request.headers.get("last-event-id")
+    if last_id and last_id.isdigit():
+        since = int(last_id)
+    q = hub.subscribe(since)
+    if q is None:
+        raise HTTPException(status_code=503, detail="Troppi client collegati", headers={"Retry-After": "30"})
+    return StreamingResponse(live_stream(request, q), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
 @app.post("/movements/new")
-async def new_movement(request: Request, user: User = Depends(get_current_user), db: Session = Depends(get_db),
+async def new_movement(request: Request, user: User = Depends(get_current_user), db = Depends(get_async_db),
                       member_id: int = Form(...), kind: str = Form(...), rule_id: int | None = Form(None),
                       crocette: int = Form(0), note: str = Form("") ):
-    mv = Movement(member_id=member_id, user_id=user.id, kind=kind, rule_id=rule_id,
-                  crocette=crocette, casse=0, note=note)
-    db.add(mv)
-    db.commit()
+    def write(db: Session):
+        mv = Movement(member_id=member_id, user_id=user.id, kind=kind, rule_id=rule_id,
+                      crocette=crocette, casse=0, note=note)
+        db.add(mv)
+        balances.record_movement(db, mv)
+        stats.refresh(db, [(mv.member_id, mv.created_at)])
+        db.commit()
+        return mv.id
+    mv_id = await run_db(db, write)
+    hub.publish("movement", await run_db(db, live_delta, [member_id], [mv_id]))
     return RedirectResponse("/movements?ok=1", status_code=status.HTTP_302_FOUND)
 
+# ---- inserimento multiplo ----
+@app.get("/movements/batch", response_class=HTMLResponse)
+async def movements_batch_page(request: Request, db = Depends(get_async_db)):
+    user = await get_optional_user(request, db, authorize=True)
+    if not user:
+        return RedirectResponse("/login?next=/movements/batch", status_code=302)
+    members, rules = await run_db(db, lambda s: (
+        s.query(Member).order_by(Member.name).all(),
+        s.query(Rule).filter(Rule.active == True).order_by(Rule.title).all(),
+    ))
+    return templates.TemplateResponse("movements_batch.html",
+                                      {"request": request, "members": members, "rules": rules, "user": user})
+
+@app.post("/movements/batch")
+async def new_movements_batch(payload: MovementBatchIn, user: User = Depends(get_current_user),
+                              db = Depends(get_async_db)):
+    """Molti movimenti in una transazione: un solo INSERT multiplo e un aggiornamento del ledger per membro."""
+    batch_id = payload.batch_id or uuid.uuid4().hex
+    rows = [m.model_dump() for m in payload.movements]
+
+    def write(db: Session):
+        plan, errors = plan_batch(db, rows, user.id, batch_id)
+        if errors:
+            return None, errors
+        try:
+            inserted = apply_import(db, plan)
+            db.commit()
+        except IntegrityError:
+            # doppio invio concorrente dello stesso batch: l'altra richiesta ha già scritto queste chiavi,
+            # si risponde come a un reinvio (tutto già presente)
+            db.rollback()
+            plan, _ = plan_batch(db, rows, user.id, batch_id)
+            if plan.inserts:
+                raise
+            inserted = 0
+        new_keys = {r["import_key"] for r in plan.inserts}
+        keys = [r["import_key"] for r in plan.inserts + plan.duplicates]
+        found = db.query(Movement.id, Movement.import_key).filter(Movement.import_key.in_(keys)).all() if keys else []
+        new_ids = [i for i, k in found if k in new_keys]
+        return (inserted, len(plan.duplicates), sorted(i for i, _ in found), new_ids,
+                {r["member_id"] for r in plan.inserts}), []
+
+    result, errors = await run_db(db, write)
+    if errors:
+        return JSONResponse({"detail": errors}, status_code=status.HTTP_422_UNPROCESSABLE_ENTITY)
+    inserted, duplicates, ids, new_ids, member_ids = result
+    if inserted:
+        hub.publish("movement", await run_db(db, live_delta, sorted(member_ids), new_ids))
+    # ids = tutti i movimenti del batch, anche quelli già presenti: un reinvio ottiene la stessa risposta
+    return {"batch_id": batch_id, "inserted": inserted, "duplicates": duplicates, "ids": ids}
+
 # ====== HARD DELETE (elimina definitivamente) ======
 @app.post("/movements/delete")
 async def delete_movement(user: User = Depends(get_current_user),
-                          db: Session = Depends(get_db),
+                          db = Depends(get_async_db),
                           movement_id: int = Form(...),
                           next: str | None = Form(None)):
     # solo admin, oppure scommenta la riga sotto per consentirlo anche all'autore:
@@ -316,57 +690,187 @@ async def delete_movement(user: User = Depends(get_current_user),
     if user.role != "admin":
         raise HTTPException(status_code=403, detail="Solo admin può eliminare")
 
-    mv = db.query(Movement).filter(Movement.id == movement_id).first()
-    if not mv:
+    def write(db: Session):
+        mv = db.query(Movement).filter(Movement.id == movement_id).first()
+        if not mv:
+            return False
+        db.delete(mv)
+        balances.revert_movement(db, mv)
+        stats.refresh(db, [(mv.member_id, mv.created_at)])
+        db.commit()
+        return mv.member_id
+    member_id = await run_db(db, write)
+    if not member_id:
         raise HTTPException(status_code=404, detail="Movimento non trovato")
-
-    db.delete(mv)
-    db.commit()
+    hub.publish("movement_deleted", {"id": movement_id, **await run_db(db, live_delta, [member_id])})
     target = next if (next and next.startswith("/")) else "/storico"
     return RedirectResponse(target, status_code=303)
 
 # ---- admin page ----
 @app.get("/admin", response_class=HTMLResponse)
-async def admin_page(request: Request, user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+async def admin_page(request: Request, user: User = Depends(get_current_user), db = Depends(get_async_db)):
     if user.role != "admin":
         return RedirectResponse("/", status_code=302)
+    bagherone, members, rules = await run_db(db, lambda s: (
+        get_or_create_bagherone(s),
+        s.query(Member).order_by(Member.name).all(),
+        s.query(Rule).order_by(Rule.title).all(),
+    ))
     return templates.TemplateResponse("admin.html", {
         "request": request,
-        "members": db.query(Member).order_by(Member.name).all(),
-        "rules": db.query(Rule).order_by(Rule.title).all(),
-        "bagherone": get_or_create_bagherone(db),
+        "members": members,
+        "rules": rules,
+        "bagherone": bagherone,
         "user": user,
     })
 
+@app.get("/admin/pool")
+async def admin_pool(user: User = Depends(get_current_user)):
+    if user.role != "admin":
+        raise HTTPException(status_code=403, detail="Solo admin")
+    return JSONResponse(pool_stats())
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics_endpoint(request: Request, db = Depends(get_async_db)):
+    if not (METRICS_TOKEN and hmac.compare_digest(request.headers.get("authorization", ""), f"Bearer {METRICS_TOKEN}")):
+        user = await get_optional_user(request, db, authorize=True)
+        if not user or user.role != "admin":
+            raise HTTPException(status_code=401, detail="Token metriche mancante o errato")
+    return PlainTextResponse(metrics.render_prometheus(pool_stats()),
+                             media_type="text/plain; version=0.0.4; charset=utf-8")
+
 @app.post("/admin/member")
-async def add_member(user: User = Depends(get_current_user), db: Session = Depends(get_db), name: str = Form(...)):
+async def add_member(user: User = Depends(get_current_user), db = Depends(get_async_db), name: str = Form(...)):
     if user.role != "admin":
         return RedirectResponse("/", status_code=302)
-    db.add(Member(name=name))
-    db.commit()
+    def write(db: Session):
+        db.add(Member(name=name))
+        db.commit()
+    await run_db(db, write)
+    hub.publish("resync", {})  # nuova scheda membro: serve il render completo
     return RedirectResponse("/admin?member=ok", status_code=302)
 
 @app.post("/admin/rule")
-async def add_rule(user: User = Depends(get_current_user), db: Session = Depends(get_db),
+async def add_rule(user: User = Depends(get_current_user), db = Depends(get_async_db),
                    title: str = Form(...), description: str = Form(""), crocette: int = Form(0)):
     if user.role != "admin":
         return RedirectResponse("/", status_code=302)
-    db.add(Rule(title=title, description=description, crocette=crocette, casse=0))
-    db.commit()
+    def write(db: Session):
+        db.add(Rule(title=title, description=description, crocette=crocette, casse=0))
+        db.commit()
+    await run_db(db, write)
+    hub.publish("resync", {})
     return RedirectResponse("/admin?rule=ok", status_code=302)
 
 @app.post("/admin/bagherone")
 async def update_bagherone(
     user: User = Depends(get_current_user),
-    db: Session = Depends(get_db),
+    db = Depends(get_async_db),
     giovani: int = Form(...),
     vecchi: int = Form(...)
 ):
     if user.role != "admin":
         return RedirectResponse("/", status_code=302)
     
-    score = get_or_create_bagherone(db)
-    score.giovani = giovani
-    score.vecchi = vecchi
-    db.commit()
+    def write(db: Session):
+        score = get_or_create_bagherone(db)
+        score.giovani = giovani
+        score.vecchi = vecchi
+        db.commit()
+        db.refresh(score)  # updated_at è calcolato dal database
+        return BagheroneOut.model_validate(score)
+    score = await run_db(db, write)
+    hub.publish("bagherone", score)
     return RedirectResponse("/admin?bagherone=ok", status_code=303)
+
+
+# ============ API JSON (sola lettura) ============
+# Ogni risposta porta un ETag forte derivato dalla versione dei dati nel DB: i client che fanno
+# polling (widget, app) ricevono 304 con una sola lookup per chiave primaria, e qualsiasi scrittura
+# (anche da CLI, script o un'altra istanza) cambia l'ETag.
+def etag_for(request: Request, version: int, *parts) -> str:
+    raw = "|".join(map(str, (version, request.url.path, request.url.query, *parts)))
+    return '"' + hashlib.sha1(raw.encode()).hexdigest()[:20] + '"'
+
+def etag_matches(request: Request, etag: str) -> bool:
+    inm = request.headers.get("if-none-match")
+    if not inm:
+        return False
+    tags = [t.strip().removeprefix("W/") for t in inm.split(",")]
+    return "*" in tags or etag in tags
+
+def not_modified_since(request: Request, last_modified: datetime) -> bool:
+    # If-Modified-Since conta solo se manca If-None-Match (RFC 9110)
+    ims = request.headers.get("if-modified-since")
+    if not ims or request.headers.get("if-none-match"):
+        return False
+    try:
+        return last_modified <= parsedate_to_datetime(ims)
+    except (TypeError, ValueError):
+        return False
+
+async def api_response(request: Request, db, build, *parts):
+    etag = etag_for(request, await run_db(db, current_data_version), *parts)
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if etag_matches(request, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    body = await run_db(db, build)
+    return JSONResponse(jsonable_encoder(body), headers=headers)
+
+@app.get("/api/v1/members")
+async def api_members(request: Request, db = Depends(get_async_db)):
+    def build(db: Session):
+        rows = sorted(member_rows(db), key=lambda r: r["name"].lower())
+        return [MemberBalanceOut(**r) for r in rows]
+    return await api_response(request, db, build)
+
+@app.get("/api/v1/movements")
+async def api_movements(request: Request,
+                        kind: str = "all",
+                        member_id: str | None = Query(None),
+                        cursor: str | None = Query(None),
+                        limit: int | None = Query(None),
+                        db = Depends(get_async_db)):
+    def build(db: Session):
+        _, _, filters = movement_filters(kind, member_id)
+        moves, next_cursor, _, _ = paginate_movements(db, filters, cursor, limit)
+        return MovementPage(items=[MovementOut.model_validate(m) for m in moves], next_cursor=next_cursor)
+    return await api_response(request, db, build)
+
+@app.get("/api/v1/rules")
+async def api_rules(request: Request, db = Depends(get_async_db)):
+    def build(db: Session):
+        rules = db.query(Rule).filter(Rule.active == True).order_by(Rule.title).all()
+        return [RuleOut.model_validate(r) for r in rules]
+    return await api_response(request, db, build)
+
+@app.get("/api/v1/rules/suggest")
+async def api_rules_suggest(note: str = Query("", max_length=200),
+                            k: int = Query(3, ge=1, le=10),
+                            db = Depends(get_async_db)):
+    matcher = await run_db(db, get_rule_matcher)
+    return [{"rule_id": c.rule_id, "title": c.title, "score": c.score}
+            for c in matcher.rank(note, k=k, min_score=0.25)]
+
+@app.get("/api/v1/calendar/upcoming")
+async def api_calendar_upcoming(request: Request,
+                                group: str = Query("paste", pattern="^(paste|match|birthday)$"),
+                                limit: int = Query(5, ge=1, le=100),
+                                db = Depends(get_async_db)):
+    now = datetime.now()
+    # gli eventi "prossimi" cambiano a mezzanotte e quando si salva il calendario (versione dei dati)
+    def build(db: Session):
+        return [CalendarEventOut(**e) for e in calendar_store.upcoming(db, group, now, limit)]
+    return await api_response(request, db, build, now.date())
+
+@app.get("/api/v1/stats")
+async def api_stats(request: Request, k: int = Query(10, ge=1, le=50), db = Depends(get_async_db)):
+    def build(db: Session):
+        return stats.overview(db, k)
+    return await api_response(request, db, build)
+
+@app.get("/api/v1/bagherone")
+async def api_bagherone(request: Request, db = Depends(get_async_db)):
+    def build(db: Session):
+        return BagheroneOut.model_validate(get_or_create_bagherone(db))
+    return await api_response(request, db, build)
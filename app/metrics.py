@@ -0,0 +1,301 @@
+"""
+Metriche per richiesta: latenza per rotta, numero e tempo delle query SQL, render dei template,
+parse del calendario, compressione e dimensione delle risposte.
+
+- `MetricsMiddleware` (ASGI puro, non rompe lo streaming) apre un RequestStats in una ContextVar,
+  aggiunge l'header `Server-Timing` e a fine risposta aggiorna gli istogrammi;
+- `instrument_engine` conta le query tramite gli eventi before/after_cursor_execute: la ContextVar
+  arriva anche nel threadpool e nei greenlet di AsyncSession.run_sync;
+- `timed("template")` misura un segmento qualsiasi dentro la richiesta corrente;
+- `render_prometheus()` produce il testo per `/metrics`.
+
+Le richieste più lente di SLOW_REQUEST_MS finiscono nel log con le query più lente.
+"""
+import heapq
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from sqlalchemy import event
+
+log = logging.getLogger("crocette.metrics")
+
+SLOW_REQUEST_MS = float(os.getenv("SLOW_REQUEST_MS", "500"))
+SLOW_TOP_STATEMENTS = 5
+
+# secondi; le stesse soglie per latenza richiesta, tempo SQL e template
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+SIZE_BUCKETS = (512, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)  # byte
+SEGMENTS = ("sql", "template", "calendar", "compress", "minify")
+
+
+class RequestStats:
+    __slots__ = ("started", "sql_count", "segments", "slowest")
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.sql_count = 0
+        self.segments = dict.fromkeys(SEGMENTS, 0.0)
+        self.slowest: list[tuple[float, int, str]] = []  # min-heap delle query più lente
+
+    def add_statement(self, seconds: float, statement: str):
+        self.sql_count += 1
+        self.segments["sql"] += seconds
+        item = (seconds, self.sql_count, statement)
+        if len(self.slowest) < SLOW_TOP_STATEMENTS:
+            heapq.heappush(self.slowest, item)
+        elif seconds > self.slowest[0][0]:
+            heapq.heapreplace(self.slowest, item)
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started
+
+    def server_timing(self) -> str:
+        parts = [
+            f"app;dur={self.elapsed() * 1000:.1f}",
+            f'sql;dur={self.segments["sql"] * 1000:.1f};desc="{self.sql_count} queries"',
+        ]
+        parts += [f"{name};dur={self.segments[name] * 1000:.1f}" for name in SEGMENTS[1:] if self.segments[name]]
+        return ", ".join(parts)
+
+
+_current: ContextVar[RequestStats | None] = ContextVar("crocette_request_stats", default=None)
+
+
+def current() -> RequestStats | None:
+    return _current.get()
+
+
+@contextmanager
+def timed(segment: str):
+    stats = _current.get()
+    if stats is None:
+        yield
+        return
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        stats.segments[segment] = stats.segments.get(segment, 0.0) + time.perf_counter() - t0
+
+
+# ------------ ISTOGRAMMI ------------
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # l'ultimo è +Inf
+        self.total = 0.0
+        self.n = 0
+
+    def observe(self, value: float):
+        i = 0
+        while i < len(self.buckets) and value > self.buckets[i]:
+            i += 1
+        self.counts[i] += 1
+        self.total += value
+        self.n += 1
+
+
+class Registry:
+    """Istogrammi per (metodo, rotta) e contatori per status; le rotte sono i template di path, non gli URL."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latency: dict[tuple, Histogram] = {}
+        self.sql_count: dict[tuple, Histogram] = {}
+        self.segment_seconds: dict[tuple, Histogram] = {}
+        self.responses: dict[tuple, int] = {}
+        self.slow_requests = 0
+        # compressione (app/compression.py): byte in ingresso/uscita e CPU per rotta e codifica
+        self.body_size: dict[tuple, Histogram] = {}
+        self.compress_in: dict[tuple, int] = {}
+        self.compress_out: dict[tuple, int] = {}
+        self.compress_seconds: dict[tuple, float] = {}
+        self.minify = [0, 0, 0.0]  # byte prima, byte dopo, secondi
+
+    def record(self, method: str, route: str, status: int, stats: RequestStats, elapsed: float,
+               long_lived: bool = False):
+        key = (method, route)
+        with self._lock:
+            rkey = key + (str(status),)
+            self.responses[rkey] = self.responses.get(rkey, 0) + 1
+            if long_lived:
+                return  # stream SSE: la durata è quella della connessione, non del lavoro
+            self.latency.setdefault(key, Histogram(LATENCY_BUCKETS)).observe(elapsed)
+            self.sql_count.setdefault(key, Histogram(COUNT_BUCKETS)).observe(stats.sql_count)
+            for name, seconds in stats.segments.items():
+                self.segment_seconds.setdefault(key + (name,), Histogram(LATENCY_BUCKETS)).observe(seconds)
+            if elapsed * 1000 >= SLOW_REQUEST_MS:
+                self.slow_requests += 1
+
+
+    def record_body(self, method: str, route: str, encoding: str, sent_bytes: int):
+        with self._lock:
+            self.body_size.setdefault((method, route, encoding), Histogram(SIZE_BUCKETS)).observe(sent_bytes)
+
+    def record_compression(self, route: str, encoding: str, raw_bytes: int, out_bytes: int, seconds: float):
+        with self._lock:
+            key = (route, encoding)
+            self.compress_in[key] = self.compress_in.get(key, 0) + raw_bytes
+            self.compress_out[key] = self.compress_out.get(key, 0) + out_bytes
+            self.compress_seconds[key] = self.compress_seconds.get(key, 0.0) + seconds
+
+    def record_minify(self, before: int, after: int, seconds: float):
+        with self._lock:
+            self.minify[0] += before
+            self.minify[1] += after
+            self.minify[2] += seconds
+
+
+registry = Registry()
+
+
+# ------------ SQLALCHEMY ------------
+def instrument_engine(sync_engine):
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("_metrics_t0", []).append(time.perf_counter())
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        t0 = conn.info["_metrics_t0"].pop()
+        stats = _current.get()
+        if stats is not None:
+            stats.add_statement(time.perf_counter() - t0, statement)
+
+    @event.listens_for(sync_engine, "handle_error")
+    def _error(ctx):
+        stack = ctx.connection.info.get("_metrics_t0") if ctx.connection is not None else None
+        if stack:
+            stack.pop()
+
+
+# ------------ MIDDLEWARE ------------
+def route_label(scope) -> str:
+    # APIRoute mette sé stessa in scope["route"]; i Mount (static) aggiornano root_path
+    route = scope.get("route")
+    if route is not None and getattr(route, "path", None):
+        return route.path
+    return scope.get("root_path") or "unmatched"
+
+
+class MetricsMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        stats = RequestStats()
+        token = _current.set(stats)
+        status_code = 500
+        long_lived = False
+
+        async def send_with_timing(message):
+            nonlocal status_code, long_lived
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                headers = list(message.get("headers", []))
+                long_lived = any(k == b"content-type" and v.startswith(b"text/event-stream") for k, v in headers)
+                headers.append((b"server-timing", stats.server_timing().encode("latin-1")))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _current.reset(token)
+            elapsed = stats.elapsed()
+            route = route_label(scope)
+            registry.record(scope["method"], route, status_code, stats, elapsed, long_lived)
+            if elapsed * 1000 >= SLOW_REQUEST_MS and not long_lived:
+                _log_slow(scope, route, status_code, stats, elapsed)
+
+
+def _log_slow(scope, route, status_code, stats: RequestStats, elapsed: float):
+    lines = [
+        f"richiesta lenta {scope['method']} {scope['path']} ({route}) -> {status_code} in {elapsed * 1000:.0f}ms, "
+        f"{stats.sql_count} query / {stats.segments['sql'] * 1000:.0f}ms SQL, "
+        f"template {stats.segments['template'] * 1000:.0f}ms, calendario {stats.segments['calendar'] * 1000:.0f}ms"
+    ]
+    for seconds, n, statement in sorted(stats.slowest, reverse=True):
+        sql = " ".join(statement.split())
+        lines.append(f"  #{n} {seconds * 1000:.1f}ms {sql[:300]}")
+    log.warning("\n".join(lines))
+
+
+# ------------ PROMETHEUS ------------
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(**kw) -> str:
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in kw.items()) + "}"
+
+
+def _histogram_lines(name: str, hist: Histogram, labels: dict) -> list[str]:
+    out, cumulative = [], 0
+    for bound, count in zip(list(hist.buckets) + ["+Inf"], hist.counts):
+        cumulative += count
+        out.append(f"{name}_bucket{_labels(**labels, le=bound)} {cumulative}")
+    out.append(f"{name}_sum{_labels(**labels)} {hist.total:.6f}")
+    out.append(f"{name}_count{_labels(**labels)} {hist.n}")
+    return out
+
+
+def render_prometheus(pools: dict | None = None) -> str:
+    r = registry
+    lines = []
+    with r._lock:
+        lines += ["# HELP http_request_duration_seconds Latenza delle richieste per rotta.",
+                  "# TYPE http_request_duration_seconds histogram"]
+        for (method, route), h in sorted(r.latency.items()):
+            lines += _histogram_lines("http_request_duration_seconds", h, {"method": method, "route": route})
+        lines += ["# HELP http_request_sql_statements Query SQL eseguite per richiesta.",
+                  "# TYPE http_request_sql_statements histogram"]
+        for (method, route), h in sorted(r.sql_count.items()):
+            lines += _histogram_lines("http_request_sql_statements", h, {"method": method, "route": route})
+        lines += ["# HELP http_request_segment_seconds Tempo per richiesta speso in SQL, template e calendario.",
+                  "# TYPE http_request_segment_seconds histogram"]
+        for (method, route, segment), h in sorted(r.segment_seconds.items()):
+            lines += _histogram_lines("http_request_segment_seconds", h,
+                                      {"method": method, "route": route, "segment": segment})
+        lines += ["# HELP http_responses_total Risposte per rotta e status.", "# TYPE http_responses_total counter"]
+        for (method, route, code), n in sorted(r.responses.items()):
+            lines.append(f"http_responses_total{_labels(method=method, route=route, status=code)} {n}")
+        lines += ["# HELP http_slow_requests_total Richieste oltre SLOW_REQUEST_MS.",
+                  "# TYPE http_slow_requests_total counter", f"http_slow_requests_total {r.slow_requests}"]
+        lines += ["# HELP http_response_size_bytes Byte di body inviati per rotta e codifica.",
+                  "# TYPE http_response_size_bytes histogram"]
+        for (method, route, encoding), h in sorted(r.body_size.items()):
+            lines += _histogram_lines("http_response_size_bytes", h,
+                                      {"method": method, "route": route, "encoding": encoding})
+        for name, values, help_ in (
+            ("http_compression_input_bytes_total", r.compress_in, "Byte prima della compressione."),
+            ("http_compression_output_bytes_total", r.compress_out, "Byte dopo la compressione."),
+            ("http_compression_seconds_total", r.compress_seconds, "CPU spesa a comprimere."),
+        ):
+            lines += [f"# HELP {name} {help_}", f"# TYPE {name} counter"]
+            for (route, encoding), v in sorted(values.items()):
+                value = f"{v:.6f}" if isinstance(v, float) else v
+                lines.append(f"{name}{_labels(route=route, encoding=encoding)} {value}")
+        before, after, seconds = r.minify
+        lines += ["# HELP html_minify_input_bytes_total HTML prima della minificazione.",
+                  "# TYPE html_minify_input_bytes_total counter", f"html_minify_input_bytes_total {before}",
+                  "# HELP html_minify_output_bytes_total HTML dopo la minificazione.",
+                  "# TYPE html_minify_output_bytes_total counter", f"html_minify_output_bytes_total {after}",
+                  "# HELP html_minify_seconds_total CPU spesa a minificare.",
+                  "# TYPE html_minify_seconds_total counter", f"html_minify_seconds_total {seconds:.6f}"]
+    # contatori del pool (database.pool_stats), una famiglia per chiave
+    keys = sorted({k for info in (pools or {}).values() for k, v in info.items()
+                   if isinstance(v, (int, float)) and not isinstance(v, bool)})
+    for key in keys:
+        lines.append(f"# TYPE db_pool_{key} gauge")
+        for engine_name, info in pools.items():
+            if key in info:
+                lines.append(f"db_pool_{key}{_labels(engine=engine_name)} {info[key]}")
+    return "\n".join(lines) + "\n"
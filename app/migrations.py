@@ -0,0 +1,182 @@
+"""
+Migrazioni di schema versionate.
+
+La versione applicata sta nella tabella `schema_version`; all'avvio l'app legge solo quella riga
+(`check_current`) invece di interrogare il catalogo con create_all. Da riga di comando:
+
+    python -m app.migrations status    # versione attuale e migrazioni mancanti
+    python -m app.migrations upgrade   # applica le migrazioni mancanti
+
+Ogni migrazione gira in una transazione insieme alla riga di versione e deve essere idempotente
+(IF NOT EXISTS / checkfirst), così si può applicare anche a DB creati prima di questo sistema.
+Per aggiungerne una: nuova funzione `_mNNN_...(conn)` e una riga in MIGRATIONS.
+"""
+import os
+import sys
+from datetime import datetime
+
+from sqlalchemy import inspect, text
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.orm import Session
+
+from .database import Base, engine
+
+# con AUTO_MIGRATE=0 l'app si rifiuta di partire su uno schema vecchio invece di migrarlo
+AUTO_MIGRATE = os.getenv("AUTO_MIGRATE", "1").lower() in ("1", "true", "yes")
+
+
+def _m001_baseline(conn):
+    # tabelle esistenti prima delle migrazioni (users, members, rules, movements, bagherone_score,
+    # member_balances) + colonna import_key, che create_all non aggiunge alle tabelle già presenti
+    from . import models  # noqa: F401  registra i modelli su Base.metadata
+    Base.metadata.create_all(bind=conn)
+    cols = {c["name"] for c in inspect(conn).get_columns("movements")}
+    if "import_key" not in cols:
+        conn.execute(text("ALTER TABLE movements ADD COLUMN import_key VARCHAR(64)"))
+    conn.execute(text("CREATE UNIQUE INDEX IF NOT EXISTS ix_movements_import_key ON movements (import_key)"))
+
+
+def _m002_hot_path_indexes(conn):
+    # saldi per membro / storico filtrato, totali per tipo, elenco regole attive ordinate
+    conn.execute(text(
+        "CREATE INDEX IF NOT EXISTS ix_movements_member_kind_created ON movements (member_id, kind, created_at)"))
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_movements_kind_created ON movements (kind, created_at)"))
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_rules_active_title ON rules (active, title)"))
+
+
+def _m003_populate_member_balances(conn):
+    # il ledger nasce vuoto sui DB che hanno già movimenti: lo ricostruiamo una volta dallo storico
+    from . import balances
+    db = Session(bind=conn)
+    if db.execute(text("SELECT 1 FROM member_balances LIMIT 1")).first() is None:
+        balances.rebuild(db)
+    db.flush()
+
+
+def _m004_seasons(conn):
+    # stagioni chiuse: riepiloghi mensili e archivio dei movimenti grezzi (app/seasons.py)
+    from .models import ArchivedMovement, Season, SeasonRollup
+    Base.metadata.create_all(bind=conn, tables=[Season.__table__, SeasonRollup.__table__,
+                                                ArchivedMovement.__table__])
+
+
+def _m005_stats_member_month(conn):
+    # statistiche precalcolate (app/stats.py), popolate una volta dallo storico
+    from . import stats
+    from .models import MemberMonthStat
+    Base.metadata.create_all(bind=conn, tables=[MemberMonthStat.__table__])
+    db = Session(bind=conn)
+    stats.rebuild(db)
+    db.flush()
+
+
+def _m006_calendar_tables(conn):
+    # calendario nel DB (app/calendar_store.py): la prima volta importa il vecchio app/data/calendar.txt
+    from . import calendar_store
+    from .models import CalendarEvent, CalendarSource
+    Base.metadata.create_all(bind=conn, tables=[CalendarEvent.__table__, CalendarSource.__table__])
+    db = Session(bind=conn)
+    calendar_store.ensure_seeded(db)
+    db.flush()
+
+
+def _m007_data_version(conn):
+    # versione dei dati condivisa tra processi (cache e ETag, vedi app/database.py)
+    from .models import DataVersion
+    Base.metadata.create_all(bind=conn, tables=[DataVersion.__table__])
+    if conn.execute(text("SELECT 1 FROM data_version WHERE id = 1")).first() is None:
+        conn.execute(text("INSERT INTO data_version (id, version) VALUES (1, 1)"))
+
+
+def _m008_archive_surrogate_id(conn):
+    # movements_archive riusava l'id di movements come chiave: con gli id riciclati da SQLite la seconda
+    # chiusura falliva. Ora id è proprio dell'archivio e l'id originale sta in original_id
+    cols = {c["name"] for c in inspect(conn).get_columns("movements_archive")}
+    if "original_id" not in cols:
+        conn.execute(text("ALTER TABLE movements_archive ADD COLUMN original_id INTEGER"))
+    conn.execute(text("UPDATE movements_archive SET original_id = id WHERE original_id IS NULL"))
+    if conn.dialect.name == "postgresql":
+        # le righe copiate con id esplicito non hanno fatto avanzare la sequenza
+        conn.execute(text("SELECT setval(pg_get_serial_sequence('movements_archive', 'id'), "
+                          "COALESCE((SELECT MAX(id) FROM movements_archive), 0) + 1, false)"))
+
+
+MIGRATIONS = [
+    (1, "baseline schema + movements.import_key", _m001_baseline),
+    (2, "hot-path indexes on movements and rules", _m002_hot_path_indexes),
+    (3, "populate member_balances from movements", _m003_populate_member_balances),
+    (4, "seasons, season_rollups, movements_archive", _m004_seasons),
+    (5, "stats_member_month summary table", _m005_stats_member_month),
+    (6, "calendar_events, calendar_source", _m006_calendar_tables),
+    (7, "data_version counter", _m007_data_version),
+    (8, "movements_archive surrogate id + original_id", _m008_archive_surrogate_id),
+]
+LATEST = MIGRATIONS[-1][0]
+
+
+def _ensure_version_table(conn):
+    conn.execute(text(
+        "CREATE TABLE IF NOT EXISTS schema_version ("
+        " version INTEGER PRIMARY KEY, description VARCHAR(200) NOT NULL, applied_at TIMESTAMP NOT NULL)"
+    ))
+
+
+def current_version(bind=engine) -> int:
+    try:
+        with bind.connect() as conn:
+            return conn.execute(text("SELECT max(version) FROM schema_version")).scalar() or 0
+    except DBAPIError:
+        return 0  # tabella non ancora creata
+
+
+def upgrade(bind=engine, out=None) -> list[int]:
+    applied = []
+    with bind.begin() as conn:
+        _ensure_version_table(conn)
+    for version, description, fn in MIGRATIONS:
+        with bind.begin() as conn:
+            done = conn.execute(text("SELECT 1 FROM schema_version WHERE version = :v"), {"v": version}).first()
+            if done:
+                continue
+            fn(conn)
+            conn.execute(
+                text("INSERT INTO schema_version (version, description, applied_at) VALUES (:v, :d, :t)"),
+                {"v": version, "d": description, "t": datetime.utcnow()},
+            )
+        applied.append(version)
+        if out:
+            print(f"  applicata {version:03d}: {description}", file=out)
+    return applied
+
+
+def check_current(bind=engine):
+    """Controllo all'avvio: una sola query sulla versione; migra (o si ferma) solo se indietro."""
+    version = current_version(bind)
+    if version >= LATEST:
+        return
+    if not AUTO_MIGRATE:
+        raise RuntimeError(
+            f"Schema DB alla versione {version}, richiesta {LATEST}: esegui `python -m app.migrations upgrade`."
+        )
+    upgrade(bind)
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    cmd = argv[0] if argv else "status"
+    if cmd == "upgrade":
+        applied = upgrade(out=sys.stdout)
+        print(f"OK ✔ Schema alla versione {current_version()} ({len(applied)} migrazioni applicate).")
+        return 0
+    if cmd == "status":
+        version = current_version()
+        print(f"Versione attuale: {version} (ultima: {LATEST})")
+        for v, description, _ in MIGRATIONS:
+            print(f"  [{'x' if v <= version else ' '}] {v:03d} {description}")
+        return 0
+    print("Uso: python -m app.migrations [status|upgrade]")
+    return 2
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -2,7 +2,7 @@ from __future__ import annotations
 from datetime import datetime
 
 from sqlalchemy import (
-    Integer, String, Boolean, DateTime, ForeignKey, Text, Column
+    Integer, String, Boolean, DateTime, ForeignKey, Text, Column, Index
 )
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
@@ -37,6 +37,9 @@ class Rule(Base):
     casse: Mapped[int] = mapped_column(Integer, default=0)
     active: Mapped[bool] = mapped_column(Boolean, default=True)
 
+    # indici creati dalla migrazione 002 (app/migrations.py)
+    __table_args__ = (Index("ix_rules_active_title", "active", "title"),)
+
 
 class Movement(Base):
     __tablename__ = "movements"
@@ -49,10 +52,27 @@ class Movement(Base):
     crocette: Mapped[int] = mapped_column(Integer, default=0)
     casse: Mapped[int] = mapped_column(Integer, default=0)
     rule_id: Mapped[int | None] = mapped_column(ForeignKey("rules.id"), nullable=True)
+    # chiave di idempotenza degli import (vedi app/importer.py); NULL per i movimenti inseriti a mano
+    import_key: Mapped[str | None] = mapped_column(String(64), nullable=True, unique=True, index=True)
 
     member: Mapped["Member"] = relationship(back_populates="movements")
     rule: Mapped["Rule | None"] = relationship()
 
+    # indici creati dalla migrazione 002 (app/migrations.py)
+    __table_args__ = (
+        Index("ix_movements_member_kind_created", "member_id", "kind", "created_at"),
+        Index("ix_movements_kind_created", "kind", "created_at"),
+    )
+
+
+class MemberBalance(Base):
+    # Saldo denormalizzato per membro, aggiornato insieme ai movimenti (vedi app/balances.py)
+    __tablename__ = "member_balances"
+    member_id: Mapped[int] = mapped_column(ForeignKey("members.id", ondelete="CASCADE"), primary_key=True)
+    crocette_prese: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    crocette_pagate: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    last_movement_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
+
 
 # Punteggio Bagherone
 from sqlalchemy.sql import func  # import locale, serve qui sotto
@@ -68,3 +88,107 @@ class BagheroneScore(Base):
         server_default=func.now(),
         onupdate=func.now(),
     )
+
+
+# ------------ STAGIONI CHIUSE (vedi app/seasons.py) ------------
+class Season(Base):
+    __tablename__ = "seasons"
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    name: Mapped[str] = mapped_column(String(40), unique=True)  # es. "2025/2026"
+    started_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
+    ended_at: Mapped[datetime] = mapped_column(DateTime)  # i movimenti prima di questa data sono archiviati
+    closed_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    movements_archived: Mapped[int] = mapped_column(Integer, default=0)
+
+
+class SeasonRollup(Base):
+    # Totali per stagione/membro/regola/mese/tipo; nomi copiati per restare leggibili anche se membro o regola spariscono
+    __tablename__ = "season_rollups"
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    season_id: Mapped[int] = mapped_column(ForeignKey("seasons.id", ondelete="CASCADE"))
+    month: Mapped[str] = mapped_column(String(7))  # YYYY-MM
+    member_id: Mapped[int] = mapped_column(Integer)
+    member_name: Mapped[str] = mapped_column(String(80))
+    rule_id: Mapped[int | None] = mapped_column(Integer, nullable=True)
+    rule_title: Mapped[str | None] = mapped_column(String(120), nullable=True)
+    kind: Mapped[str] = mapped_column(String(10))
+    movements: Mapped[int] = mapped_column(Integer, default=0)
+    crocette: Mapped[int] = mapped_column(Integer, default=0)
+    casse: Mapped[int] = mapped_column(Integer, default=0)
+
+    __table_args__ = (
+        Index("ix_season_rollups_season_member", "season_id", "member_id"),
+        Index("ix_season_rollups_season_month", "season_id", "month"),
+    )
+
+
+class ArchivedMovement(Base):
+    # Movimenti grezzi delle stagioni chiuse: stesse colonne di movements, senza vincoli verso membri/regole
+    __tablename__ = "movements_archive"
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    # id che aveva in movements: SQLite riusa gli id cancellati, quindi non è unico tra stagioni
+    original_id: Mapped[int] = mapped_column(Integer)
+    season_id: Mapped[int] = mapped_column(ForeignKey("seasons.id", ondelete="CASCADE"))
+    member_id: Mapped[int] = mapped_column(Integer)
+    user_id: Mapped[int] = mapped_column(Integer)
+    created_at: Mapped[datetime] = mapped_column(DateTime)
+    kind: Mapped[str] = mapped_column(String(10))
+    note: Mapped[str] = mapped_column(String(200), default="")
+    crocette: Mapped[int] = mapped_column(Integer, default=0)
+    casse: Mapped[int] = mapped_column(Integer, default=0)
+    rule_id: Mapped[int | None] = mapped_column(Integer, nullable=True)
+    import_key: Mapped[str | None] = mapped_column(String(64), nullable=True)
+
+    __table_args__ = (Index("ix_movements_archive_season_member", "season_id", "member_id", "created_at"),)
+
+
+# ------------ STATISTICHE PRECALCOLATE (vedi app/stats.py) ------------
+class MemberMonthStat(Base):
+    # Totali per mese/membro/regola/tipo della stagione corrente, aggiornati a ogni scrittura su movements
+    __tablename__ = "stats_member_month"
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    month: Mapped[str] = mapped_column(String(7))  # YYYY-MM
+    member_id: Mapped[int] = mapped_column(Integer)
+    rule_id: Mapped[int | None] = mapped_column(Integer, nullable=True)
+    kind: Mapped[str] = mapped_column(String(10))
+    movements: Mapped[int] = mapped_column(Integer, default=0)
+    crocette: Mapped[int] = mapped_column(Integer, default=0)
+
+    __table_args__ = (
+        Index("ix_stats_member_month_member_month", "member_id", "month"),
+        Index("ix_stats_member_month_month", "month"),
+    )
+
+
+# ------------ CALENDARIO (vedi app/calendar_store.py) ------------
+class CalendarEvent(Base):
+    # Una riga per evento riconosciuto nel testo del calendario, ricreate a ogni salvataggio
+    __tablename__ = "calendar_events"
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    date: Mapped[datetime] = mapped_column(DateTime)
+    type: Mapped[str] = mapped_column(String(20))  # paste | home | away | birthday
+    who: Mapped[str] = mapped_column(String(200), default="")
+    emoji: Mapped[str] = mapped_column(String(8))
+    raw: Mapped[str] = mapped_column(Text)
+    line: Mapped[int] = mapped_column(Integer)  # posizione nel testo, per l'export stabile
+
+    __table_args__ = (
+        Index("ix_calendar_events_date", "date"),
+        Index("ix_calendar_events_type_date", "type", "date"),
+    )
+
+
+class CalendarSource(Base):
+    # Testo così come scritto dall'admin (righe vuote, "NO PASTE", commenti): riga unica, id=1
+    __tablename__ = "calendar_source"
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    text: Mapped[str] = mapped_column(Text, default="")
+    updated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+
+
+# ------------ VERSIONE DEI DATI (vedi app/database.py) ------------
+class DataVersion(Base):
+    # Contatore incrementato nella stessa transazione di ogni scrittura: riga unica, id=1
+    __tablename__ = "data_version"
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    version: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
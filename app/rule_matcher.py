@@ -0,0 +1,138 @@
+"""
+Abbinamento nota -> regola per gli import e per il suggerimento nel form /movements.
+
+L'indice si costruisce una volta sola sulle regole (titolo + descrizione):
+- token normalizzati: minuscole, senza accenti, senza numerazione tipo "1A.", senza stopword,
+  con una radice grezza (vocale finale tolta) così "Gesti di stizza" e "Gesto di stizza" coincidono;
+- un indice inverso token -> regole e uno trigramma -> token, per tollerare refusi: "gesto di stiza"
+  trova "Gesto di stizza" (0.68). Un refuso pesa metà di un match esatto, quindi una parola sbagliata da
+  sola ("stiza", 0.3) resta sotto la soglia di `best` e compare solo tra i suggerimenti di `rank`.
+
+Il costo per nota dipende solo dai suoi token e dalle regole candidate, non da tutte le regole.
+"""
+import math
+import re
+import unicodedata
+from collections import defaultdict
+from dataclasses import dataclass
+
+STOPWORDS = {
+    "a", "ad", "al", "alla", "alle", "allo", "agli", "ai", "con", "da", "dal", "dalla", "dei", "del", "della",
+    "delle", "dello", "di", "e", "ed", "gli", "i", "il", "in", "la", "le", "lo", "nel", "nella", "o", "per",
+    "su", "sul", "sulla", "tra", "un", "una", "uno", "x", "vs",
+}
+_NUMBERING = re.compile(r"^\s*\d+[a-z]?\.\s*", re.I)
+_WORD = re.compile(r"[a-z0-9]+")
+
+# pesi del punteggio: copertura del titolo, copertura della nota, copertura della descrizione
+W_TITLE, W_NOTE, W_DESC = 0.6, 0.3, 0.1
+FUZZY_MIN = 0.5
+
+
+def _fold(s: str) -> str:
+    s = unicodedata.normalize("NFKD", s.lower())
+    return "".join(c for c in s if not unicodedata.combining(c))
+
+
+def _stem(tok: str) -> str:
+    return re.sub(r"[aeiou]+$", "", tok) if len(tok) > 4 else tok
+
+
+def tokens(text: str, strip_numbering: bool = False) -> list[str]:
+    text = _fold(text or "")
+    if strip_numbering:
+        text = _NUMBERING.sub("", text)
+    return [_stem(t) for t in _WORD.findall(text) if t not in STOPWORDS]
+
+
+def trigrams(tok: str) -> set[str]:
+    t = f" {tok} "
+    return {t[i:i + 3] for i in range(len(t) - 2)}
+
+
+@dataclass(frozen=True)
+class Candidate:
+    rule_id: int
+    title: str
+    score: float
+
+
+class RuleMatcher:
+    def __init__(self, rules):
+        """rules: iterabile di (id, title, description) oppure oggetti Rule."""
+        self._titles: dict[int, str] = {}
+        self._title_toks: dict[int, set[str]] = {}
+        self._desc_toks: dict[int, set[str]] = {}
+        self._postings: dict[str, set[int]] = defaultdict(set)
+        self._tri: dict[str, set[str]] = defaultdict(set)
+        for r in rules:
+            rid, title, desc = (r.id, r.title, r.description) if hasattr(r, "id") else r
+            t = set(tokens(title, strip_numbering=True))
+            d = set(tokens(desc or "")) - t
+            self._titles[rid] = title
+            self._title_toks[rid] = t
+            self._desc_toks[rid] = d
+            for tok in t | d:
+                self._postings[tok].add(rid)
+        n = max(1, len(self._titles))
+        self._idf = {tok: math.log(1 + n / len(ids)) for tok, ids in self._postings.items()}
+        self._max_idf = math.log(1 + n)
+        for tok in self._postings:
+            for g in trigrams(tok):
+                self._tri[g].add(tok)
+
+    def __len__(self):
+        return len(self._titles)
+
+    def _expand(self, tok: str) -> list[tuple[str, float]]:
+        # token noto -> match esatto; altrimenti i token del vocabolario più simili per trigrammi
+        if tok in self._postings:
+            return [(tok, 1.0)]
+        grams = trigrams(tok)
+        shared = defaultdict(int)
+        for g in grams:
+            for v in self._tri.get(g, ()):
+                shared[v] += 1
+        out = []
+        for v, k in shared.items():
+            sim = k / (len(grams) + len(trigrams(v)) - k)
+            if sim >= FUZZY_MIN:
+                out.append((v, sim))
+        return sorted(out, key=lambda x: -x[1])[:3]
+
+    def rank(self, note: str, k: int = 5, min_score: float = 0.0) -> list[Candidate]:
+        q = list(dict.fromkeys(tokens(note)))
+        if not q:
+            return []
+        q_weight = {t: self._idf.get(t, self._max_idf) for t in q}
+        q_total = sum(q_weight.values())
+        # per regola: miglior similarità per token del titolo/descrizione e per token della nota
+        title_hit: dict[int, dict[str, float]] = defaultdict(dict)
+        desc_hit: dict[int, dict[str, float]] = defaultdict(dict)
+        note_hit: dict[int, dict[str, float]] = defaultdict(dict)
+        for qt in q:
+            for v, sim in self._expand(qt):
+                for rid in self._postings[v]:
+                    bucket = title_hit if v in self._title_toks[rid] else desc_hit
+                    bucket[rid][v] = max(bucket[rid].get(v, 0.0), sim)
+                    note_hit[rid][qt] = max(note_hit[rid].get(qt, 0.0), sim)
+        out = []
+        for rid, hits in note_hit.items():
+            t_toks, d_toks = self._title_toks[rid], self._desc_toks[rid]
+            t_total = sum(self._idf[t] for t in t_toks) or 1.0
+            d_total = sum(self._idf[t] for t in d_toks) or 1.0
+            r_title = sum(self._idf[v] * s for v, s in title_hit[rid].items()) / t_total
+            r_desc = sum(self._idf[v] * s for v, s in desc_hit[rid].items()) / d_total
+            p_note = sum(q_weight[t] * s for t, s in hits.items()) / q_total
+            score = W_TITLE * r_title + W_NOTE * p_note + W_DESC * r_desc
+            if score >= min_score:
+                out.append(Candidate(rid, self._titles[rid], round(score, 4)))
+        out.sort(key=lambda c: (-c.score, len(c.title), c.rule_id))
+        return out[:k]
+
+    def best(self, note: str, min_score: float = 0.5) -> Candidate | None:
+        """Regola più probabile, o None se sotto soglia o se in testa c'è un pari merito."""
+        ranked = self.rank(note, k=2, min_score=min_score)
+        if not ranked or (len(ranked) > 1 and ranked[1].score == ranked[0].score):
+            return None
+        return ranked[0]
@@ -17,9 +17,22 @@ class MovementIn(BaseModel):
     rule_id: int | None = None
     note: str = ""
 
+class MovementBatchIn(BaseModel):
+    # batch_id generato dal client: se lo stesso invio arriva due volte, le righe non vengono duplicate
+    batch_id: str | None = Field(None, max_length=64)
+    movements: list[MovementIn] = Field(min_length=1, max_length=200)
+
 class MemberIn(BaseModel):
     name: str
 
+class MemberBalanceOut(MemberIn):
+    id: int
+    crocette_prese: int
+    crocette_pagate: int
+    crocette_da_pagare: int
+    balance: int
+    last: datetime | None
+
 class RuleIn(BaseModel):
     title: str
     description: str = ""
@@ -27,6 +40,12 @@ class RuleIn(BaseModel):
     casse: int = 0
     active: bool = True
 
+class RuleOut(RuleIn):
+    id: int
+
+    class Config:
+        from_attributes = True
+
 class MovementOut(BaseModel):
     id: int
     member_id: int
@@ -40,3 +59,21 @@ class MovementOut(BaseModel):
 
     class Config:
         from_attributes = True
+
+class MovementPage(BaseModel):
+    items: list[MovementOut]
+    next_cursor: str | None = None
+
+class CalendarEventOut(BaseModel):
+    date: datetime
+    type: str
+    who: str
+    emoji: str
+
+class BagheroneOut(BaseModel):
+    giovani: int
+    vecchi: int
+    updated_at: datetime | None
+
+    class Config:
+        from_attributes = True
@@ -0,0 +1,201 @@
+"""
+Chiusura stagione.
+
+    python -m app.seasons list
+    python -m app.seasons close 2025/2026 [--until 2026-07-01] [--dry-run]
+
+La chiusura, in una sola transazione:
+1. scrive i riepiloghi per membro/regola/mese/tipo (season_rollups) con un INSERT ... SELECT GROUP BY;
+2. copia i movimenti grezzi precedenti a `until` in movements_archive e li toglie da movements;
+3. riporta il saldo di chiusura di ogni membro come movimento "Saldo iniziale" della stagione nuova;
+4. ricostruisce il ledger member_balances e le statistiche, che da lì in poi contano solo la stagione corrente.
+
+Storico, saldi e totali lavorano così solo sulle righe della stagione in corso; le stagioni chiuse
+restano consultabili da /stagioni tramite i riepiloghi.
+"""
+import argparse
+import sys
+from datetime import datetime
+
+from sqlalchemy import case, func, insert, literal, select
+from sqlalchemy.orm import Session
+
+from . import balances, stats
+from .database import SessionLocal
+from .migrations import upgrade
+from .models import ArchivedMovement, Member, Movement, Rule, Season, SeasonRollup, User
+
+
+class InvalidUntil(ValueError):
+    """Data di chiusura nel futuro o non successiva alla fine della stagione precedente."""
+
+
+def _closing_balances(db: Session, until: datetime) -> dict[int, tuple[int, int]]:
+    deb = func.coalesce(func.sum(case((Movement.kind == "debit", Movement.crocette), else_=0)), 0)
+    cre = func.coalesce(func.sum(case((Movement.kind == "credit", Movement.crocette), else_=0)), 0)
+    q = db.query(Movement.member_id, deb, cre).filter(Movement.created_at < until).group_by(Movement.member_id)
+    return {mid: (d, c) for mid, d, c in q}
+
+
+def check_until(db: Session, until: datetime) -> Season | None:
+    """Valida la data di chiusura e restituisce l'ultima stagione chiusa (se c'è)."""
+    if until > datetime.utcnow():
+        raise InvalidUntil("La data di chiusura non può essere nel futuro")
+    prev = db.query(Season).order_by(Season.ended_at.desc()).first()
+    if prev and until <= prev.ended_at:
+        raise InvalidUntil(f"La data di chiusura deve essere dopo la fine di {prev.name} ({prev.ended_at:%d/%m/%Y})")
+    return prev
+
+
+def preview(db: Session, until: datetime) -> dict:
+    """Cosa farebbe la chiusura, senza scrivere: movimenti da archiviare e saldi da riportare."""
+    balances_ = _closing_balances(db, until)
+    names = dict(db.query(Member.id, Member.name).filter(Member.id.in_(balances_)).all()) if balances_ else {}
+    return {
+        "movements": db.query(func.count(Movement.id)).filter(Movement.created_at < until).scalar(),
+        "carry": sorted(
+            ((names.get(mid, str(mid)), c - d) for mid, (d, c) in balances_.items() if c != d),
+            key=lambda x: x[0].lower(),
+        ),
+    }
+
+
+def close_season(db: Session, name: str, user_id: int, until: datetime | None = None) -> Season:
+    """Chiude la stagione `name` archiviando i movimenti con created_at < until. Il commit resta al chiamante."""
+    until = until or datetime.utcnow()
+    name = name.strip()
+    if not name:
+        raise ValueError("Nome stagione obbligatorio")
+    if db.query(Season.id).filter(Season.name == name).first():
+        raise ValueError(f"La stagione {name!r} è già chiusa")
+    prev = check_until(db, until)
+
+    old = Movement.created_at < until
+    started_at = prev.ended_at if prev else db.query(func.min(Movement.created_at)).filter(old).scalar()
+    season = Season(name=name, started_at=started_at, ended_at=until, closed_at=datetime.utcnow())
+    db.add(season)
+    db.flush()
+    sid = literal(season.id)
+
+    # 1) riepiloghi
+    month = stats.month_bucket(Movement.created_at, db.get_bind().dialect.name)
+    db.execute(insert(SeasonRollup).from_select(
+        ["season_id", "month", "member_id", "member_name", "rule_id", "rule_title", "kind",
+         "movements", "crocette", "casse"],
+        select(sid, month, Movement.member_id, Member.name, Movement.rule_id, Rule.title, Movement.kind,
+               func.count(Movement.id), func.coalesce(func.sum(Movement.crocette), 0),
+               func.coalesce(func.sum(Movement.casse), 0))
+        .select_from(Movement)
+        .join(Member, Member.id == Movement.member_id)
+        .outerjoin(Rule, Rule.id == Movement.rule_id)
+        .where(old, stats.COUNTED)  # i saldi iniziali riportati dalla stagione prima non sono movimenti suoi
+        .group_by(month, Movement.member_id, Member.name, Movement.rule_id, Rule.title, Movement.kind),
+    ))
+
+    # 2) archivio dei movimenti grezzi
+    cols = ["member_id", "user_id", "created_at", "kind", "note", "crocette", "casse", "rule_id", "import_key"]
+    db.execute(insert(ArchivedMovement).from_select(
+        ["season_id", "original_id", *cols], select(sid, Movement.id, *(getattr(Movement, c) for c in cols)).where(old),
+    ))
+    closing = _closing_balances(db, until)
+    season.movements_archived = db.query(Movement).filter(old).delete(synchronize_session=False)
+
+    # 3) saldo di chiusura -> movimento di apertura della stagione nuova
+    openings = []
+    for mid, (deb, cre) in closing.items():
+        if deb == cre:
+            continue
+        openings.append({
+            "member_id": mid, "user_id": user_id, "created_at": until,
+            "kind": "debit" if deb > cre else "credit", "crocette": abs(deb - cre), "casse": 0,
+            "note": f"Saldo iniziale (chiusura {name})", "rule_id": None,
+            "import_key": f"opening:{season.id}:{mid}",
+        })
+    if openings:
+        db.execute(insert(Movement), openings)
+
+    # 4) ledger e statistiche della stagione corrente
+    balances.rebuild(db)
+    stats.rebuild(db)
+    return season
+
+
+# ------------ CONSULTAZIONE ------------
+def season_summary(db: Session, season_id: int) -> dict:
+    """Totali di una stagione chiusa letti solo dai riepiloghi."""
+    R = SeasonRollup
+    deb = func.coalesce(func.sum(case((R.kind == "debit", R.crocette), else_=0)), 0)
+    cre = func.coalesce(func.sum(case((R.kind == "credit", R.crocette), else_=0)), 0)
+    base = db.query(R).filter(R.season_id == season_id)
+    by_member = (
+        base.with_entities(R.member_name, deb, cre, func.sum(R.movements))
+        .group_by(R.member_id, R.member_name)
+        .order_by((deb - cre).desc(), R.member_name)
+        .all()
+    )
+    by_rule = (
+        base.with_entities(R.rule_title, func.sum(R.movements), func.sum(R.crocette))
+        .filter(R.kind == "debit", R.rule_id.isnot(None))
+        .group_by(R.rule_id, R.rule_title)
+        .order_by(func.sum(R.crocette).desc())
+        .all()
+    )
+    by_month = base.with_entities(R.month, deb, cre, func.sum(R.movements)).group_by(R.month).order_by(R.month).all()
+    return {
+        "by_member": [{"name": n, "prese": d, "pagate": c, "da_pagare": max(0, d - c), "movements": k}
+                      for n, d, c, k in by_member],
+        "by_rule": [{"title": t, "movements": k, "crocette": c} for t, k, c in by_rule],
+        "by_month": [{"month": m, "prese": d, "pagate": c, "movements": k} for m, d, c, k in by_month],
+    }
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser(prog="python -m app.seasons", description="Chiusura e consultazione stagioni")
+    sub = p.add_subparsers(dest="cmd", required=True)
+    sub.add_parser("list")
+    c = sub.add_parser("close")
+    c.add_argument("name", help='es. "2025/2026"')
+    c.add_argument("--until", help="YYYY-MM-DD: archivia i movimenti precedenti (default: adesso)")
+    c.add_argument("--user", default="admin", help="utente a cui intestare i saldi iniziali")
+    c.add_argument("--dry-run", action="store_true")
+    args = p.parse_args(argv)
+
+    upgrade()
+    db = SessionLocal()
+    try:
+        if args.cmd == "list":
+            for s in db.query(Season).order_by(Season.ended_at).all():
+                start = f"{s.started_at:%d/%m/%Y}" if s.started_at else "—"
+                print(f"{s.id:>3}  {s.name:<12} {start} → {s.ended_at:%d/%m/%Y}  {s.movements_archived} movimenti")
+            return 0
+        try:
+            until = datetime.strptime(args.until, "%Y-%m-%d") if args.until else datetime.utcnow()
+            check_until(db, until)
+        except ValueError as e:
+            print(f"ERRORE: {e}")
+            return 1
+        info = preview(db, until)
+        print(f"Stagione {args.name}: {info['movements']} movimenti da archiviare (prima del {until:%d/%m/%Y %H:%M})")
+        for member, balance in info["carry"]:
+            print(f"  saldo iniziale {member}: {'+' if balance > 0 else ''}{balance}")
+        if args.dry_run:
+            print("DRY-RUN: nessuna modifica.")
+            return 0
+        user = db.query(User).filter(User.username == args.user).first()
+        if not user:
+            print(f"Utente {args.user!r} non trovato.")
+            return 1
+        try:
+            season = close_season(db, args.name, user.id, until)
+        except ValueError as e:
+            print(f"ERRORE: {e}")
+            return 1
+        db.commit()
+        print(f"OK ✔ Stagione {season.name} chiusa.")
+        return 0
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
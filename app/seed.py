@@ -1,11 +1,11 @@
 from sqlalchemy.orm import Session
-from .database import engine, SessionLocal
+from .database import SessionLocal
+from .migrations import upgrade
 from .models import User, Rule, Member
 from .auth import hash_password
 
 def init_db():
-    from .database import Base
-    Base.metadata.create_all(bind=engine)
+    upgrade()
 
     db: Session = SessionLocal()
     try:
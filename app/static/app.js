@@ -62,6 +62,11 @@ document.addEventListener("DOMContentLoaded", () => {
     applySort();
   });
   filterInput.addEventListener("input", applyFilter);
+  // saldi aggiornati da live.js: riapplica ordinamento e filtro
+  document.addEventListener("members:changed", () => {
+    applySort();
+    applyFilter();
+  });
 
   // Ripristina ultima scelta ordinamento se esiste
   const savedSort = localStorage.getItem("sortOrder");
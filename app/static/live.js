@@ -0,0 +1,174 @@
+// Aggiornamenti live della dashboard: ascolta /events (SSE) e applica i delta al DOM,
+// senza ricaricare la pagina. Gli handler sono idempotenti: ricevere due volte lo stesso evento non fa danni.
+(function () {
+  const root = document.getElementById("pane-saldi");
+  if (!root || !window.EventSource) return;
+  const isAdmin = root.dataset.admin === "1";
+  const MONTH_MAX = 50;
+
+  function fmtDate(iso, withTime) {
+    if (!iso) return "—";
+    // il server manda datetime naive "YYYY-MM-DDTHH:MM:SS": li mostriamo così come sono
+    const [d, t] = iso.split("T");
+    const [y, m, dd] = d.split("-");
+    const out = `${dd}/${m}/${y}`;
+    return withTime && t ? `${out} ${t.slice(0, 5)}` : out;
+  }
+
+  function setText(id, value) {
+    const el = document.getElementById(id);
+    if (el) el.textContent = value;
+  }
+
+  function el(tag, cls, text) {
+    const e = document.createElement(tag);
+    if (cls) e.className = cls;
+    if (text !== undefined) e.textContent = text;
+    return e;
+  }
+
+  function patchTotals(t) {
+    if (!t) return;
+    setText("kpi-prese", t.crocette_prese_total);
+    setText("kpi-pagate", t.crocette_pagate);
+    setText("kpi-due", t.crocette_da_pagare);
+    setText("kpi-cassa", `€${t.crocette_da_pagare * 2}`);
+  }
+
+  function patchMember(r) {
+    const card = root.querySelector(`.member[data-id="${r.id}"]`);
+    if (!card) return false;
+    card.dataset.cpre = r.crocette_prese;
+    card.dataset.cpay = r.crocette_pagate;
+    card.dataset.cdue = r.crocette_da_pagare;
+    card.dataset.last = r.last || "";
+    const f = (name) => card.querySelector(`[data-f="${name}"]`);
+    f("cpre").textContent = r.crocette_prese;
+    f("cpay").textContent = r.crocette_pagate;
+    f("cdue").textContent = r.crocette_da_pagare;
+    f("last").textContent = fmtDate(r.last, true);
+    const critical = r.crocette_da_pagare >= 10;
+    f("critical").classList.toggle("hidden", !critical);
+    ["ring-1", "ring-red-500/50", "bg-red-900/10"].forEach((c) => card.classList.toggle(c, critical));
+    const box = f("balance-box"), bal = f("balance");
+    box.classList.remove("border-green-500", "bg-green-900/10", "border-red-500", "bg-red-900/10", "border-neutral-600");
+    bal.classList.remove("text-green-400", "text-red-400");
+    if (r.balance > 0) {
+      box.classList.add("border-green-500", "bg-green-900/10");
+      bal.classList.add("text-green-400");
+    } else if (r.balance < 0) {
+      box.classList.add("border-red-500", "bg-red-900/10");
+      bal.classList.add("text-red-400");
+    } else {
+      box.classList.add("border-neutral-600");
+    }
+    bal.textContent = (r.balance > 0 ? "+" : "") + r.balance;
+    return true;
+  }
+
+  function patchMembers(rows) {
+    if (!rows || !rows.length) return;
+    // membro nuovo non presente nella pagina: serve il render completo
+    if (!rows.every(patchMember)) return resync();
+    document.dispatchEvent(new Event("members:changed"));
+  }
+
+  function patchLatest(mv) {
+    const box = document.getElementById("latest-movement");
+    if (!box) return;
+    box.replaceChildren();
+    if (!mv) {
+      box.appendChild(el("div", "opacity-70 text-sm", "Nessun movimento ancora presente."));
+      return;
+    }
+    const wrap = el("div", "border-l-4 border-team pl-3");
+    const head = el("div", "text-sm opacity-80", `${fmtDate(mv.created_at)} — `);
+    head.appendChild(el("b", "", mv.member));
+    const body = el("div", "mt-2 text-sm", mv.crocette ? `${mv.crocette} crocette` : "");
+    if (mv.rule) body.appendChild(el("span", "opacity-70", ` (${mv.rule})`));
+    if (mv.note) body.appendChild(document.createTextNode(` — ${mv.note}`));
+    wrap.append(head, body);
+    box.appendChild(wrap);
+  }
+
+  function monthItem(mv) {
+    const li = el("li", "p-2 rounded bg-neutral-900 flex justify-between items-center");
+    li.dataset.id = mv.id;
+    const left = el("span");
+    left.appendChild(el("b", "", mv.member));
+    let text = ` — ${mv.kind === "debit" ? "debito" : "credito"}`;
+    if (mv.crocette) text += ` ${mv.crocette} ❌`;
+    left.appendChild(document.createTextNode(text + " "));
+    if (mv.rule) left.appendChild(el("span", "opacity-70", `(${mv.rule})`));
+    if (mv.note) left.appendChild(document.createTextNode(` — ${mv.note}`));
+    const right = el("span", "flex items-center gap-2");
+    right.appendChild(el("span", "opacity-70", fmtDate(mv.created_at, true)));
+    if (isAdmin) {
+      const form = el("form");
+      form.method = "post";
+      form.action = "/movements/delete";
+      form.onsubmit = () => confirm("Eliminare definitivamente questo movimento?");
+      for (const [name, value] of [["movement_id", mv.id], ["next", "/#saldi"]]) {
+        const input = el("input");
+        input.type = "hidden";
+        input.name = name;
+        input.value = value;
+        form.appendChild(input);
+      }
+      const btn = el("button", "px-2 py-1 rounded border border-neutral-700 text-xs hover:border-team", "🗑️");
+      btn.title = "Elimina";
+      form.appendChild(btn);
+      right.appendChild(form);
+    }
+    li.append(left, right);
+    return li;
+  }
+
+  function addToMonth(mv) {
+    const list = document.getElementById("month-moves");
+    if (!list || list.querySelector(`li[data-id="${mv.id}"]`)) return;
+    const now = new Date();
+    const [y, m] = mv.created_at.split("-").map(Number);
+    if (y !== now.getFullYear() || m !== now.getMonth() + 1) return;
+    list.querySelectorAll("li:not([data-id])").forEach((li) => li.remove()); // "Nessun movimento..."
+    list.prepend(monthItem(mv));
+    const items = list.querySelectorAll("li[data-id]");
+    for (let i = MONTH_MAX; i < items.length; i++) items[i].remove();
+  }
+
+  function removeFromMonth(id) {
+    const li = document.querySelector(`#month-moves li[data-id="${id}"]`);
+    if (li) li.remove();
+  }
+
+  let reloading = false;
+  function resync() {
+    if (reloading) return;
+    reloading = true;
+    // un po' di jitter: con tanti spettatori i reload non arrivano tutti nello stesso istante
+    setTimeout(() => location.reload(), Math.random() * 2000);
+  }
+
+  const src = new EventSource(`/events?since=${encodeURIComponent(root.dataset.liveSince || "")}`);
+  src.addEventListener("movement", (e) => {
+    const d = JSON.parse(e.data);
+    patchTotals(d.totals);
+    patchLatest(d.latest);
+    (d.movements || []).forEach(addToMonth); // dal più vecchio: il più recente finisce in cima
+    patchMembers(d.members);
+  });
+  src.addEventListener("movement_deleted", (e) => {
+    const d = JSON.parse(e.data);
+    patchTotals(d.totals);
+    patchLatest(d.latest);
+    removeFromMonth(d.id);
+    patchMembers(d.members);
+  });
+  src.addEventListener("bagherone", (e) => {
+    const d = JSON.parse(e.data);
+    setText("bag-giovani", d.giovani);
+    setText("bag-vecchi", d.vecchi);
+    setText("bag-updated", fmtDate(d.updated_at, true));
+  });
+  src.addEventListener("resync", resync);
+})();
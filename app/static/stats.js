@@ -0,0 +1,72 @@
+// Grafico a barre delle crocette prese per mese (squadra o singolo membro), in SVG senza librerie.
+(function () {
+  const box = document.getElementById("stats-chart");
+  const select = document.getElementById("stats-member");
+  const monthRules = document.getElementById("stats-month-rules");
+  if (!box || !select) return;
+  const SVG = "http://www.w3.org/2000/svg";
+  const MONTHS = ["gen", "feb", "mar", "apr", "mag", "giu", "lug", "ago", "set", "ott", "nov", "dic"];
+  let data = null;
+
+  function label(month) {
+    const [y, m] = month.split("-");
+    return `${MONTHS[parseInt(m) - 1]} ${y.slice(2)}`;
+  }
+
+  function node(tag, attrs, text) {
+    const e = document.createElementNS(SVG, tag);
+    for (const [k, v] of Object.entries(attrs)) e.setAttribute(k, v);
+    if (text !== undefined) e.textContent = text;
+    return e;
+  }
+
+  function showRules(month) {
+    const rules = (data.top_rules_by_month || {})[month] || [];
+    monthRules.textContent = rules.length
+      ? `${label(month)}: ` + rules.map((r) => `${r.title} (${r.crocette})`).join(", ")
+      : "";
+  }
+
+  function draw() {
+    const member = data.members.find((m) => String(m.member_id) === select.value);
+    const values = member ? member.crocette : data.totals;
+    box.replaceChildren();
+    if (!data.months.length) {
+      box.textContent = "Nessun dato per questa stagione.";
+      return;
+    }
+    box.classList.remove("opacity-70");
+    const barW = 36, gap = 12, h = 180, top = 18, bottom = 22;
+    const max = Math.max(1, ...values);
+    const width = data.months.length * (barW + gap) + gap;
+    const svg = node("svg", { width, height: h + top + bottom, class: "block" });
+    data.months.forEach((month, i) => {
+      const v = values[i], x = gap + i * (barW + gap), bh = Math.round((v / max) * h);
+      const g = node("g", { class: "cursor-pointer" });
+      g.appendChild(node("title", {}, `${label(month)}: ${v} crocette`));
+      g.appendChild(node("rect", { x, y: top + h - bh, width: barW, height: bh, rx: 4, class: "fill-current text-team" }));
+      if (v) g.appendChild(node("text", { x: x + barW / 2, y: top + h - bh - 4, "text-anchor": "middle", "font-size": 11, fill: "currentColor" }, v));
+      g.appendChild(node("text", { x: x + barW / 2, y: top + h + 15, "text-anchor": "middle", "font-size": 10, fill: "currentColor", opacity: 0.7 }, label(month)));
+      g.addEventListener("mouseenter", () => showRules(month));
+      g.addEventListener("click", () => showRules(month));
+      svg.appendChild(g);
+    });
+    box.appendChild(svg);
+    showRules(data.months[data.months.length - 1]);
+  }
+
+  fetch("/api/v1/stats")
+    .then((r) => r.json())
+    .then((d) => {
+      data = d;
+      for (const m of d.members) {
+        const opt = document.createElement("option");
+        opt.value = m.member_id;
+        opt.textContent = m.name;
+        select.appendChild(opt);
+      }
+      select.addEventListener("change", draw);
+      draw();
+    })
+    .catch(() => { box.textContent = "Impossibile caricare le statistiche."; });
+})();
@@ -0,0 +1,200 @@
+"""
+Statistiche precalcolate: crocette per membro e mese, regole più "multate", classifica dei membri.
+
+La tabella `stats_member_month` tiene i totali per mese/membro/regola/tipo dei movimenti della
+stagione corrente. Ogni scrittura su `movements` chiama `refresh` nella stessa transazione: si
+ricalcolano con DELETE + INSERT ... SELECT GROUP BY solo i mesi dei membri toccati, quindi il costo
+non cresce con lo storico. Pagina e API leggono solo questa tabella (classifiche con funzioni finestra).
+
+    python -m app.stats rebuild   # ricalcola tutto da movements
+    python -m app.stats check     # confronta con movements
+"""
+import sys
+from collections import Counter
+from datetime import datetime
+
+from sqlalchemy import and_, delete, func, insert, literal_column, or_, select
+from sqlalchemy.orm import Session
+
+from .database import SessionLocal
+from .migrations import upgrade
+from .models import Member, MemberMonthStat, Movement, Rule
+
+S = MemberMonthStat
+_COLS = ["month", "member_id", "rule_id", "kind", "movements", "crocette"]
+
+# i saldi iniziali riportati dalla chiusura di una stagione non sono crocette prese in quel mese
+COUNTED = or_(Movement.import_key.is_(None), Movement.import_key.notlike("opening:%"))
+
+
+def month_bucket(col, dialect: str):
+    # formato come costante SQL (non parametro): Postgres deve riconoscere la stessa espressione nel GROUP BY
+    if dialect == "postgresql":
+        return func.to_char(col, literal_column("'YYYY-MM'"))
+    return func.strftime(literal_column("'%Y-%m'"), col)
+
+
+def _month_bounds(month: str) -> tuple[datetime, datetime]:
+    y, m = map(int, month.split("-"))
+    return datetime(y, m, 1), datetime(y + m // 12, m % 12 + 1, 1)
+
+
+def _aggregate(db: Session, *where):
+    month = month_bucket(Movement.created_at, db.get_bind().dialect.name)
+    return (
+        select(month, Movement.member_id, Movement.rule_id, Movement.kind,
+               func.count(Movement.id), func.coalesce(func.sum(Movement.crocette), 0))
+        .where(COUNTED, *where)
+        .group_by(month, Movement.member_id, Movement.rule_id, Movement.kind)
+    )
+
+
+def refresh(db: Session, touched) -> int:
+    """Ricalcola i mesi toccati; touched = coppie (member_id, created_at). Il commit resta al chiamante."""
+    buckets = {(mid, f"{at:%Y-%m}") for mid, at in touched}
+    if not buckets:
+        return 0
+    db.flush()
+    db.execute(
+        delete(S).where(or_(*(and_(S.member_id == mid, S.month == month) for mid, month in buckets))),
+        execution_options={"synchronize_session": False},
+    )
+    ranges = []
+    for mid, month in buckets:
+        start, end = _month_bounds(month)
+        ranges.append(and_(Movement.member_id == mid, Movement.created_at >= start, Movement.created_at < end))
+    db.execute(insert(S).from_select(_COLS, _aggregate(db, or_(*ranges))))
+    return len(buckets)
+
+
+def rebuild(db: Session) -> int:
+    db.execute(delete(S), execution_options={"synchronize_session": False})
+    db.execute(insert(S).from_select(_COLS, _aggregate(db)))
+    db.flush()
+    return db.query(func.count(S.id)).scalar()
+
+
+def check(db: Session):
+    """Ritorna le righe (mese, membro, regola, tipo, movimenti, crocette) presenti solo da una parte."""
+    stored = Counter(tuple(r) for r in db.execute(select(*(getattr(S, c) for c in _COLS))))
+    expected = Counter(tuple(r) for r in db.execute(_aggregate(db)))
+    return sorted((expected - stored).elements(), key=str), sorted((stored - expected).elements(), key=str)
+
+
+# ------------ LETTURA ------------
+def monthly(db: Session) -> dict:
+    """Crocette prese per mese: totale squadra e serie per membro (ordinati per totale)."""
+    rows = (
+        db.query(S.month, S.member_id, Member.name, func.sum(S.crocette))
+        .join(Member, Member.id == S.member_id)
+        .filter(S.kind == "debit")
+        .group_by(S.month, S.member_id, Member.name)
+        .all()
+    )
+    months = sorted({m for m, _, _, _ in rows})
+    pos = {m: i for i, m in enumerate(months)}
+    series: dict[int, dict] = {}
+    for month, mid, name, crocette in rows:
+        s = series.setdefault(mid, {"member_id": mid, "name": name, "crocette": [0] * len(months)})
+        s["crocette"][pos[month]] = crocette
+    members = sorted(series.values(), key=lambda s: (-sum(s["crocette"]), s["name"].lower()))
+    totals = [sum(s["crocette"][i] for s in members) for i in range(len(months))]
+    return {"months": months, "totals": totals, "members": members}
+
+
+def top_rules(db: Session, k: int = 10) -> list[dict]:
+    """Regole con più crocette prese; a pari merito stessa posizione (possono uscire più di k righe)."""
+    total = func.sum(S.crocette)
+    ranked = (
+        select(S.rule_id, total.label("crocette"), func.sum(S.movements).label("volte"),
+               func.rank().over(order_by=total.desc()).label("pos"))
+        .where(S.kind == "debit", S.rule_id.isnot(None))
+        .group_by(S.rule_id)
+        .subquery()
+    )
+    q = (
+        select(ranked.c.pos, ranked.c.rule_id, Rule.title, ranked.c.volte, ranked.c.crocette)
+        .outerjoin(Rule, Rule.id == ranked.c.rule_id)
+        .where(ranked.c.pos <= k)
+        .order_by(ranked.c.pos, Rule.title)
+    )
+    return [{"pos": p, "rule_id": rid, "title": t or f"regola {rid}", "volte": v, "crocette": c}
+            for p, rid, t, v, c in db.execute(q)]
+
+
+def top_rules_by_month(db: Session, k: int = 3) -> dict[str, list[dict]]:
+    """Le k regole più frequenti di ogni mese."""
+    total = func.sum(S.crocette)
+    ranked = (
+        select(S.month, S.rule_id, total.label("crocette"),
+               func.row_number().over(partition_by=S.month, order_by=(total.desc(), S.rule_id)).label("n"))
+        .where(S.kind == "debit", S.rule_id.isnot(None))
+        .group_by(S.month, S.rule_id)
+        .subquery()
+    )
+    q = (
+        select(ranked.c.month, ranked.c.rule_id, Rule.title, ranked.c.crocette)
+        .outerjoin(Rule, Rule.id == ranked.c.rule_id)
+        .where(ranked.c.n <= k)
+        .order_by(ranked.c.month, ranked.c.n)
+    )
+    out: dict[str, list[dict]] = {}
+    for month, rid, title, crocette in db.execute(q):
+        out.setdefault(month, []).append({"rule_id": rid, "title": title or f"regola {rid}", "crocette": crocette})
+    return out
+
+
+def ranking(db: Session) -> list[dict]:
+    """I più multati della stagione: crocette prese, con posizione a pari merito."""
+    total = func.sum(S.crocette)
+    ranked = (
+        select(S.member_id, total.label("crocette"), func.sum(S.movements).label("volte"),
+               func.rank().over(order_by=total.desc()).label("pos"))
+        .where(S.kind == "debit")
+        .group_by(S.member_id)
+        .subquery()
+    )
+    q = (
+        select(ranked.c.pos, ranked.c.member_id, Member.name, ranked.c.volte, ranked.c.crocette)
+        .join(Member, Member.id == ranked.c.member_id)
+        .where(ranked.c.crocette > 0)
+        .order_by(ranked.c.pos, Member.name)
+    )
+    return [{"pos": p, "member_id": mid, "name": n, "volte": v, "crocette": c} for p, mid, n, v, c in db.execute(q)]
+
+
+def overview(db: Session, k: int = 10) -> dict:
+    return {**monthly(db), "top_rules": top_rules(db, k), "top_rules_by_month": top_rules_by_month(db),
+            "ranking": ranking(db)}
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    cmd = argv[0] if argv else "check"
+    upgrade()
+    db = SessionLocal()
+    try:
+        if cmd == "rebuild":
+            n = rebuild(db)
+            db.commit()
+            print(f"OK ✔ Ricalcolate {n} righe di statistiche.")
+        elif cmd == "check":
+            missing, extra = check(db)
+            for r in missing:
+                print(f"[MANCA] {r}")
+            for r in extra:
+                print(f"[IN PIÙ] {r}")
+            if missing or extra:
+                print("Statistiche non allineate: esegui `python -m app.stats rebuild`.")
+                return 1
+            print("OK ✔ Statistiche allineate.")
+        else:
+            print("Uso: python -m app.stats [rebuild|check]")
+            return 2
+        return 0
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
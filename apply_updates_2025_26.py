@@ -1,8 +1,10 @@
 # apply_updates_2025_26.py
 # Esegui:  python apply_updates_2025_26.py
-from app.database import SessionLocal, engine, Base
-from app.models import User, Member, Movement
+from app.database import SessionLocal, engine
+from app.models import User, Member, Movement, MemberBalance, MemberMonthStat
 from app.auth import hash_password
+from app.importer import plan_import, apply_import
+from app.migrations import upgrade
 
 from datetime import datetime
 
@@ -69,8 +71,10 @@ ADMIN_USER = ("admin", "admin123")  # se manca l'admin lo creo
 
 # ========== IMPL ==========
 def soft_reset_members_and_movements(db):
-    # Prima cancelliamo i movimenti (hanno FK su members)
+    # Prima cancelliamo movimenti e saldi (hanno FK su members)
     db.query(Movement).delete()
+    db.query(MemberBalance).delete()
+    db.query(MemberMonthStat).delete()
     # Poi azzeriamo i membri
     db.query(Member).delete()
     db.commit()
@@ -85,6 +89,7 @@ def ensure_admin(db):
     return u
 
 def main():
+    upgrade(engine)
     db = SessionLocal()
     try:
         # 1) Soft reset di members+movements (mantiene utenti e regole)
@@ -93,50 +98,20 @@ def main():
         # 2) Admin (serve per attribuire i movimenti)
         admin = ensure_admin(db)
 
-        # 3) Inserisci nuovi membri
-        name_to_id = {}
-        for n in NEW_NAMES:
-            m = Member(name=n)
-            db.add(m); db.commit(); db.refresh(m)
-            name_to_id[n] = m.id
+        # 3) Inserisci nuovi membri (un solo flush per avere gli id)
+        db.add_all([Member(name=n) for n in NEW_NAMES])
+        db.flush()
 
-        # 4) Inserisci crocette PRESE (debit)
-        now = datetime.now()
-        for nome, nota, croc in CROCETTE_PRESE:
-            mid = name_to_id.get(nome)
-            if not mid:
-                print(f"[WARN] Nome non presente in NEW_NAMES, salto debit: {nome} - {nota} ({croc})")
-                continue
-            mv = Movement(
-                member_id=mid,
-                user_id=admin.id if admin else None,
-                kind="debit",
-                crocette=int(croc),
-                casse=0,
-                note=nota,
-                created_at=now  # puoi cambiare a data specifica se vuoi
-            )
-            db.add(mv)
-        db.commit()
-
-        # 5) Inserisci crocette PAGATE (credit totali)
-        for nome, tot in CROCETTE_PAGATE.items():
-            if not tot:  # zero -> niente movimento
-                continue
-            mid = name_to_id.get(nome)
-            if not mid:
-                print(f"[WARN] Nome non presente in NEW_NAMES, salto credit: {nome} ({tot})")
-                continue
-            mv = Movement(
-                member_id=mid,
-                user_id=admin.id if admin else None,
-                kind="credit",
-                crocette=int(tot),
-                casse=0,
-                note="Pagate da inizio anno",
-                created_at=now
-            )
-            db.add(mv)
+        # 4) Crocette PRESE (debit) + 5) crocette PAGATE (credit totali), in un unico insert
+        now = datetime.now()  # puoi cambiare a data specifica se vuoi
+        rows = [{"member": nome, "note": nota, "crocette": croc, "kind": "debit"}
+                for nome, nota, croc in CROCETTE_PRESE]
+        rows += [{"member": nome, "note": "Pagate da inizio anno", "crocette": tot, "kind": "credit"}
+                 for nome, tot in CROCETTE_PAGATE.items() if tot]  # zero -> niente movimento
+        plan = plan_import(db, rows, admin.id, source="apply_updates_2025_26", rule_for=lambda row: None, now=now)
+        for row in plan.unknown_members:
+            print(f"[WARN] Nome non presente in NEW_NAMES, salto {row['kind']}: {row['member']} - {row['note']} ({row['crocette']})")
+        apply_import(db, plan)
         db.commit()
 
         print("OK ✔  Dati aggiornati.")
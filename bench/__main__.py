@@ -0,0 +1,168 @@
+import argparse
+import asyncio
+import json
+import os
+import platform
+import subprocess
+import sys
+from datetime import datetime
+from urllib.parse import urlsplit
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_DB = "sqlite:///" + os.path.join(BENCH_DIR, "data", "bench.db")
+DEFAULT_CALENDAR = os.path.join(BENCH_DIR, "data", "calendar.txt")
+RESULTS_DIR = os.path.join(BENCH_DIR, "results")
+
+
+def _redact(url: str) -> str:
+    parts = urlsplit(url)
+    if parts.password:
+        url = url.replace(f":{parts.password}@", ":***@")
+    return url
+
+
+def _is_local(url: str) -> bool:
+    return url.startswith("sqlite") or urlsplit(url).hostname in ("localhost", "127.0.0.1", "::1", None)
+
+
+def _git_rev() -> str:
+    try:
+        rev = subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True, stderr=subprocess.DEVNULL).strip()
+        dirty = subprocess.call(["git", "diff", "--quiet", "HEAD", "--", "app"], stderr=subprocess.DEVNULL) != 0
+        return rev + ("-dirty" if dirty else "")
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def cmd_generate(args):
+    from app.migrations import upgrade
+    from . import datagen
+    upgrade()
+    if datagen.counts()["movements"]:
+        if not args.reset:
+            print("Il DB contiene già movimenti: usa --reset per rigenerare.")
+            return 1
+        datagen.reset()
+    print(f"Genero {args.members} membri, {args.rules} regole, {args.movements} movimenti su {args.seasons} stagioni...")
+    datagen.generate(args.members, args.rules, args.movements, args.seasons, args.first_year,
+                     args.calendar, args.calendar_days, args.seed, out=sys.stdout)
+    print(f"OK ✔ {datagen.counts()} — calendario in {args.calendar}")
+    return 0
+
+
+def cmd_run(args):
+    from sqlalchemy import select
+    from app.database import SessionLocal
+    from app.models import Member, Rule
+    from . import datagen, runner
+
+    with SessionLocal() as db:
+        member_ids = list(db.scalars(select(Member.id)))
+        rule_ids = list(db.scalars(select(Rule.id).where(Rule.active.is_(True))))
+    if not member_ids or not rule_ids:
+        print("Dataset vuoto: esegui prima `python -m bench generate`.")
+        return 1
+    dataset = datagen.counts()
+    print(f"Dataset: {dataset}")
+    only = set(args.only.split(",")) if args.only else None
+    results = asyncio.run(runner.run(member_ids, rule_ids, args.requests, args.warmup, args.concurrency,
+                                     only, args.seed, out=sys.stdout))
+    report = {
+        "meta": {
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "git": _git_rev(),
+            "label": args.label,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "database": _redact(os.environ["DATABASE_URL"]),
+            "dataset": dataset,
+            "requests": args.requests,
+            "warmup": args.warmup,
+            "concurrency": args.concurrency,
+        },
+        "scenarios": results,
+        "peak_rss_mb": runner.peak_rss_mb(),
+    }
+    path = args.out or os.path.join(
+        RESULTS_DIR, f"{datetime.now():%Y%m%d-%H%M%S}-{report['meta']['git']}{'-' + args.label if args.label else ''}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"Risultati in {path}")
+    return 0
+
+
+def cmd_compare(args):
+    with open(args.base, encoding="utf-8") as f:
+        a = json.load(f)
+    with open(args.new, encoding="utf-8") as f:
+        b = json.load(f)
+    print(f"base {a['meta']['git']} ({a['meta']['timestamp']})  ->  nuovo {b['meta']['git']} ({b['meta']['timestamp']})")
+    da, db = a["meta"]["dataset"], b["meta"]["dataset"]
+    # lo scenario movements_new aggiunge qualche riga a ogni run: conta solo una differenza vera
+    if ({k: v for k, v in da.items() if k != "movements"} != {k: v for k, v in db.items() if k != "movements"}
+            or abs(da["movements"] - db["movements"]) > 0.01 * max(da["movements"], 1)):
+        print(f"ATTENZIONE: dataset diversi {a['meta']['dataset']} vs {b['meta']['dataset']}")
+
+    def delta(x, y):
+        return f"{(y - x) / x * 100:+6.1f}%" if x else "   n/a"
+
+    for name in sorted(set(a["scenarios"]) | set(b["scenarios"])):
+        sa, sb = a["scenarios"].get(name), b["scenarios"].get(name)
+        if not sa or not sb:
+            print(f"  {name:<16} presente solo in {'base' if sa else 'nuovo'}")
+            continue
+        cols = [f"{k[:3]} {sa[k]:>8.2f} -> {sb[k]:>8.2f}ms {delta(sa[k], sb[k])}" for k in ("p50_ms", "p95_ms", "p99_ms")]
+        print(f"  {name:<16} " + "  ".join(cols) + f"  query {sa['queries_mean']} -> {sb['queries_mean']}")
+    print(f"  peak RSS {a['peak_rss_mb']}MB -> {b['peak_rss_mb']}MB")
+    return 0
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser(prog="python -m bench", description="Benchmark su dati sintetici")
+    p.add_argument("--db", default=os.getenv("BENCH_DATABASE_URL", DEFAULT_DB),
+                   help="SQLite o Postgres locale (default bench/data/bench.db)")
+    p.add_argument("--calendar", default=DEFAULT_CALENDAR, help="file in cui scrivere il calendario generato (caricato anche nel DB)")
+    p.add_argument("--allow-remote", action="store_true", help="permette un DB non locale (ATTENZIONE: scrive dati finti)")
+    sub = p.add_subparsers(dest="cmd", required=True)
+
+    g = sub.add_parser("generate", help="crea il dataset sintetico")
+    g.add_argument("--members", type=int, default=30)
+    g.add_argument("--rules", type=int, default=40)
+    g.add_argument("--movements", type=int, default=100_000)
+    g.add_argument("--seasons", type=int, default=3)
+    g.add_argument("--first-year", type=int, default=datetime.now().year - 3)
+    g.add_argument("--calendar-days", type=int, default=None, help="default: tutte le stagioni generate")
+    g.add_argument("--seed", type=int, default=42)
+    g.add_argument("--reset", action="store_true", help="svuota membri/regole/movimenti prima di generare")
+
+    r = sub.add_parser("run", help="esegue gli scenari e salva il JSON")
+    r.add_argument("--requests", type=int, default=200)
+    r.add_argument("--warmup", type=int, default=10)
+    r.add_argument("--concurrency", type=int, default=1)
+    r.add_argument("--only", default="", help="scenari separati da virgola (index,index_cold,storico,...)")
+    r.add_argument("--label", default="", help="etichetta aggiunta al nome del file")
+    r.add_argument("--out", default=None)
+    r.add_argument("--seed", type=int, default=42)
+
+    c = sub.add_parser("compare", help="confronta due risultati")
+    c.add_argument("base")
+    c.add_argument("new")
+
+    args = p.parse_args(argv)
+    if args.cmd == "compare":
+        return cmd_compare(args)
+    if not _is_local(args.db) and not args.allow_remote:
+        print(f"{_redact(args.db)} non è locale: usa --allow-remote se sei sicuro.")
+        return 2
+    if args.db.startswith("sqlite:///"):
+        os.makedirs(os.path.dirname(os.path.abspath(args.db[len("sqlite:///"):])), exist_ok=True)
+    # l'app legge la configurazione all'import: va impostata prima di importare app.*
+    os.environ["DATABASE_URL"] = args.db
+    os.environ["CALENDAR_FILE"] = os.path.abspath(args.calendar)
+    os.environ.setdefault("SLOW_REQUEST_MS", "60000")  # niente log delle richieste lente durante le misure
+    return cmd_generate(args) if args.cmd == "generate" else cmd_run(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,126 @@
+"""Generazione del dataset sintetico: utenti, membri, regole, movimenti su più stagioni, calendario lungo."""
+import os
+import random
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import delete, func, insert, select
+from sqlalchemy.orm import Session
+
+from app import balances, calendar_store, stats
+from app.auth import hash_password
+from app.database import engine
+from app.migrations import upgrade
+from app.models import BagheroneScore, Member, MemberBalance, MemberMonthStat, Movement, Rule, User
+
+BENCH_USER = "bench"
+BENCH_PASSWORD = "bench"
+CHUNK = 20_000
+
+WORDS = (
+    "ritardo telefono pasti stizza infamata divisa scarpe palestra borraccia capitano rutto alcol "
+    "documento vacanze natale allenamento partita trasferta battuta attacco rete giallo rosso"
+).split()
+
+
+def season_bounds(first_year: int, seasons: int):
+    # una stagione va dal 1 settembre al 30 giugno dell'anno dopo
+    return [(datetime(y, 9, 1), datetime(y + 1, 6, 30, 23, 59)) for y in range(first_year, first_year + seasons)]
+
+
+def counts(bind=engine) -> dict:
+    with Session(bind=bind) as db:
+        return {
+            "members": db.scalar(select(func.count(Member.id))),
+            "rules": db.scalar(select(func.count(Rule.id))),
+            "movements": db.scalar(select(func.count(Movement.id))),
+        }
+
+
+def reset(bind=engine):
+    with bind.begin() as conn:
+        for model in (MemberBalance, MemberMonthStat, Movement, BagheroneScore, Member, Rule):
+            conn.execute(delete(model))
+        conn.execute(delete(User).where(User.username == BENCH_USER))
+
+
+def generate(members: int, rules: int, movements: int, seasons: int, first_year: int,
+             calendar_path: str, calendar_days: int | None = None, seed: int = 42, bind=engine, out=None):
+    rnd = random.Random(seed)
+    upgrade(bind)
+    bounds = season_bounds(first_year, seasons)
+
+    with bind.begin() as conn:
+        if bind.dialect.name == "sqlite":
+            # dataset usa e getta: niente fsync durante il caricamento
+            conn.exec_driver_sql("PRAGMA synchronous=OFF")
+        user_id = conn.execute(
+            insert(User).values(username=BENCH_USER, password_hash=hash_password(BENCH_PASSWORD), role="admin")
+        ).inserted_primary_key[0]
+        conn.execute(insert(Member), [{"name": f"Membro {i:04d}", "created_at": bounds[0][0]} for i in range(members)])
+        conn.execute(insert(Rule), [
+            {"title": f"{i + 1}. {' '.join(rnd.sample(WORDS, 3)).capitalize()}",
+             "description": " ".join(rnd.sample(WORDS, 5)), "crocette": rnd.choice((1, 1, 2, 2, 4, 5, 10, 20)),
+             "casse": int(rnd.random() < 0.1), "active": rnd.random() > 0.05}
+            for i in range(rules)
+        ])
+        member_ids = list(conn.scalars(select(Member.id)))
+        rule_rows = conn.execute(select(Rule.id, Rule.crocette)).all()
+
+        done = 0
+        while done < movements:
+            n = min(CHUNK, movements - done)
+            rows = []
+            for _ in range(n):
+                start, end = rnd.choice(bounds)
+                created = start + timedelta(seconds=rnd.randrange(int((end - start).total_seconds())))
+                if rnd.random() < 0.85:
+                    rid, croc = rnd.choice(rule_rows)
+                    rows.append({"member_id": rnd.choice(member_ids), "user_id": user_id, "created_at": created,
+                                 "kind": "debit", "note": " ".join(rnd.sample(WORDS, 2)), "crocette": croc or 1,
+                                 "casse": 0, "rule_id": rid})
+                else:
+                    rows.append({"member_id": rnd.choice(member_ids), "user_id": user_id, "created_at": created,
+                                 "kind": "credit", "note": "pagamento", "crocette": rnd.randint(1, 20),
+                                 "casse": 0, "rule_id": None})
+            conn.execute(insert(Movement), rows)
+            done += n
+            if out:
+                print(f"  movimenti {done}/{movements}", file=out, end="\r")
+        if out and movements:
+            print(file=out)
+
+    with Session(bind=bind) as db:
+        balances.rebuild(db)
+        stats.rebuild(db)
+        db.commit()
+
+    text = write_calendar(calendar_path, bounds[0][0].date(),
+                          calendar_days or (bounds[-1][1] - bounds[0][0]).days + 1,
+                          [f"Membro {i:04d}" for i in range(members)], rnd)
+    with Session(bind=bind) as db:
+        calendar_store.save(db, text)
+        db.commit()
+
+
+def write_calendar(path: str, start: date, days: int, names: list[str], rnd: random.Random) -> str:
+    """Una riga per giorno come nel calendario vero: paste il giovedì, partite il sabato, compleanni sparsi."""
+    birthdays = {}
+    for name in names:
+        birthdays.setdefault((rnd.randint(1, 12), rnd.randint(1, 28)), []).append(name)
+    lines = []
+    for i in range(days):
+        d = start + timedelta(days=i)
+        ds = f"{d.day}/{d.month}/{d.year}"
+        if d.weekday() == 3:
+            lines.append(f"{ds}🍕 {rnd.choice(names)}")
+        elif d.weekday() == 5:
+            lines.append(f"{ds}{'🏠' if (i // 7) % 2 else '✈️'} {' '.join(rnd.sample(WORDS, 1)).upper()}")
+        else:
+            lines.append(ds)
+        for name in birthdays.get((d.month, d.day), ()):
+            lines.append(f"{ds}🎂 {name.upper()}")
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    text = "\n".join(lines) + "\n"
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(text)
+    return text
@@ -0,0 +1,122 @@
+"""Scenari HTTP eseguiti in-process sull'app ASGI, con latenze, query per richiesta e RSS."""
+import asyncio
+import random
+import re
+import resource
+import sys
+import time
+
+import httpx
+
+from app import main as app_main
+from app.main import app
+from .datagen import BENCH_PASSWORD, BENCH_USER
+
+_QUERIES = re.compile(r'sql;[^,]*desc="(\d+) queries"')
+
+
+class Scenario:
+    def __init__(self, name: str, method: str, url, data=None, auth: bool = False, before=None):
+        self.name = name
+        self.method = method
+        self.url = url      # stringa o funzione(i, rnd) -> stringa
+        self.data = data    # None o funzione(i, rnd) -> dict del form
+        self.auth = auth
+        self.before = before  # None o funzione() chiamata prima di ogni richiesta
+
+
+def scenarios(member_ids: list[int], rule_ids: list[int]) -> list[Scenario]:
+    # prima le letture, poi le scritture: ogni scrittura invalida le cache della dashboard
+    return [
+        Scenario("index", "GET", "/"),
+        # cache HTML anonima svuotata a ogni giro: si misura il render completo
+        Scenario("index_cold", "GET", "/", before=app_main._page_cache.clear),
+        Scenario("index_user", "GET", "/", auth=True),
+        Scenario("storico", "GET", "/storico"),
+        Scenario("storico_member", "GET", lambda i, rnd: f"/storico?kind=debit&member_id={rnd.choice(member_ids)}"),
+        Scenario("calendar_txt", "GET", "/calendar.txt"),
+        Scenario("movements_new", "POST", "/movements/new", auth=True, data=lambda i, rnd: {
+            "member_id": rnd.choice(member_ids), "kind": "debit", "rule_id": rnd.choice(rule_ids),
+            "crocette": 1, "note": f"bench {i}",
+        }),
+    ]
+
+
+def peak_rss_mb() -> float:
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(rss / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)  # macOS: byte, Linux: KiB
+
+
+def percentile(sorted_values: list[float], p: float) -> float:
+    if not sorted_values:
+        return 0.0
+    k = max(0, min(len(sorted_values) - 1, round(p / 100 * len(sorted_values) + 0.5) - 1))
+    return sorted_values[k]
+
+
+def summarize(latencies: list[float], queries: list[int], statuses: dict) -> dict:
+    lat = sorted(x * 1000 for x in latencies)
+    return {
+        "requests": len(lat),
+        "p50_ms": round(percentile(lat, 50), 3),
+        "p95_ms": round(percentile(lat, 95), 3),
+        "p99_ms": round(percentile(lat, 99), 3),
+        "mean_ms": round(sum(lat) / len(lat), 3) if lat else 0.0,
+        "max_ms": round(lat[-1], 3) if lat else 0.0,
+        "queries_mean": round(sum(queries) / len(queries), 2) if queries else None,
+        "queries_max": max(queries) if queries else None,
+        "status": statuses,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+async def _login(client: httpx.AsyncClient):
+    r = await client.post("/login", data={"username": BENCH_USER, "password": BENCH_PASSWORD})
+    if "access_token" not in client.cookies:
+        raise RuntimeError(f"login benchmark fallito ({r.status_code}): hai eseguito `python -m bench generate`?")
+
+
+async def run_scenario(sc: Scenario, client: httpx.AsyncClient, requests: int, warmup: int,
+                       concurrency: int, rnd: random.Random) -> dict:
+    latencies, queries, statuses = [], [], {}
+    counter = iter(range(-warmup, requests))
+
+    async def worker():
+        for i in counter:
+            url = sc.url(i, rnd) if callable(sc.url) else sc.url
+            data = sc.data(i, rnd) if sc.data else None
+            if sc.before:
+                sc.before()
+            t0 = time.perf_counter()
+            r = await client.request(sc.method, url, data=data)
+            elapsed = time.perf_counter() - t0
+            if i < 0:
+                continue  # riscaldamento: cache, pool, template compilati
+            latencies.append(elapsed)
+            statuses[str(r.status_code)] = statuses.get(str(r.status_code), 0) + 1
+            m = _QUERIES.search(r.headers.get("server-timing", ""))
+            if m:
+                queries.append(int(m.group(1)))
+
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return summarize(latencies, queries, statuses)
+
+
+async def run(member_ids: list[int], rule_ids: list[int], requests: int = 200, warmup: int = 10,
+              concurrency: int = 1, only: set[str] | None = None, seed: int = 42, out=None) -> dict:
+    rnd = random.Random(seed)
+    transport = httpx.ASGITransport(app=app)
+    results = {}
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as anon, \
+            httpx.AsyncClient(transport=transport, base_url="http://bench") as user:
+        await _login(user)
+        for sc in scenarios(member_ids, rule_ids):
+            if only and sc.name not in only:
+                continue
+            res = await run_scenario(sc, user if sc.auth else anon, requests, warmup, concurrency, rnd)
+            results[sc.name] = res
+            if out:
+                print(f"  {sc.name:<16} p50 {res['p50_ms']:>9.2f}ms  p95 {res['p95_ms']:>9.2f}ms  "
+                      f"p99 {res['p99_ms']:>9.2f}ms  query {res['queries_mean']}  rss {res['peak_rss_mb']}MB",
+                      file=out)
+    return results
@@ -0,0 +1,114 @@
+"""
+Build degli asset statici (da eseguire prima di avviare l'app, vedi Dockerfile e render.yaml):
+
+1. CSS di Tailwind compilato e purgato dai template e dagli script (tailwind.config.js, tailwind.css)
+   al posto del runtime https://cdn.tailwindcss.com, che compila il CSS nel browser a ogni pagina;
+2. ogni file di app/static copiato in app/static/dist con l'hash del contenuto nel nome
+   (app.js -> app.3f9a1c2b7e.js), così può essere servito con Cache-Control immutable;
+3. fratelli precompressi .br (se è installato il modulo brotli) e .gz, tenuti solo se più piccoli;
+4. app/static/dist/manifest.json con la mappa nome originale -> nome con hash, letto da app/assets.py.
+
+    pip install -r requirements-build.txt
+    python build_assets.py            # tutto
+    python build_assets.py --no-css   # senza Tailwind CLI: le pagine restano sul CDN
+
+Il CLI di Tailwind si cerca in TAILWIND_BIN, poi `tailwindcss` nel PATH (pytailwindcss lo installa),
+infine `npx tailwindcss@3`.
+"""
+import argparse
+import gzip
+import hashlib
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+try:
+    import brotli
+except ImportError:  # opzionale: senza, solo .gz
+    brotli = None
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+STATIC_DIR = os.path.join(ROOT, "app", "static")
+DIST_DIR = os.path.join(STATIC_DIR, "dist")
+TAILWIND_CONFIG = os.path.join(ROOT, "tailwind.config.js")
+TAILWIND_INPUT = os.path.join(ROOT, "tailwind.css")
+
+# una variante compressa che risparmia meno del 5% non vale la negoziazione (es. il PDF)
+MIN_SAVING = 0.05
+
+
+def tailwind_cmd() -> list[str]:
+    if os.getenv("TAILWIND_BIN"):
+        return [os.environ["TAILWIND_BIN"]]
+    if shutil.which("tailwindcss"):
+        return ["tailwindcss"]
+    return ["npx", "--yes", "tailwindcss@3"]
+
+
+def build_css(out_path: str):
+    cmd = tailwind_cmd() + ["-c", TAILWIND_CONFIG, "-i", TAILWIND_INPUT, "-o", out_path, "--minify"]
+    print("  $", " ".join(cmd))
+    subprocess.run(cmd, cwd=ROOT, check=True)
+
+
+def hashed_name(name: str, data: bytes) -> str:
+    stem, ext = os.path.splitext(name)
+    return f"{stem}.{hashlib.sha256(data).hexdigest()[:10]}{ext}"
+
+
+def write_variants(path: str, data: bytes) -> list[str]:
+    with open(path, "wb") as f:
+        f.write(data)
+    written = []
+    variants = [(".gz", gzip.compress(data, compresslevel=9, mtime=0))]
+    if brotli is not None:
+        variants.insert(0, (".br", brotli.compress(data, quality=11)))
+    for suffix, packed in variants:
+        if len(packed) <= len(data) * (1 - MIN_SAVING):
+            with open(path + suffix, "wb") as f:
+                f.write(packed)
+            written.append(f"{suffix[1:]} {len(packed)}B")
+    return written
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser(prog="python build_assets.py", description="Build degli asset statici")
+    p.add_argument("--no-css", action="store_true", help="salta Tailwind (il CSS resta sul CDN)")
+    args = p.parse_args(argv)
+
+    shutil.rmtree(DIST_DIR, ignore_errors=True)
+    os.makedirs(DIST_DIR)
+    sources = {name: os.path.join(STATIC_DIR, name) for name in sorted(os.listdir(STATIC_DIR))
+               if os.path.isfile(os.path.join(STATIC_DIR, name))}
+
+    with tempfile.TemporaryDirectory() as tmp:
+        if not args.no_css:
+            css = os.path.join(tmp, "app.css")
+            try:
+                build_css(css)
+            except (OSError, subprocess.CalledProcessError) as e:
+                print(f"ERRORE: build del CSS fallita ({e}). Installa requirements-build.txt o usa --no-css.")
+                return 1
+            sources["app.css"] = css
+
+        manifest = {}
+        for name, src in sources.items():
+            with open(src, "rb") as f:
+                data = f.read()
+            target = hashed_name(name, data)
+            extra = write_variants(os.path.join(DIST_DIR, target), data)
+            manifest[name] = target
+            print(f"  {name:<36} -> dist/{target}  {len(data)}B" + (f"  ({', '.join(extra)})" if extra else ""))
+
+    with open(os.path.join(DIST_DIR, "manifest.json"), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    print(f"OK ✔ {len(manifest)} asset in {os.path.relpath(DIST_DIR, ROOT)}"
+          + ("" if brotli else " (senza .br: modulo brotli non installato)"))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
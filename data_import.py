@@ -10,9 +10,11 @@ Esegui:  python data_import.py
 
 from datetime import datetime
 import os, shutil
-from app.database import SessionLocal, engine
-from app.models import User, Member, Rule, Movement
+from app.database import SessionLocal
+from app.models import User, Member, Rule
 from app.auth import hash_password
+from app.importer import plan_import, apply_import
+from app.migrations import upgrade
 
 # --- Config ---
 CREATE_ADMIN_IF_MISSING = True
@@ -98,8 +100,7 @@ def upsert_rule(db, title, description, crocette, casse):
     return r
 
 def main():
-    from app.database import Base
-    Base.metadata.create_all(bind=engine)
+    upgrade()
     db = SessionLocal()
     try:
         # admin di default (se mancante)
@@ -107,10 +108,9 @@ def main():
             db.add(User(username=ADMIN_USER[0], password_hash=hash_password(ADMIN_USER[1]), role="admin"))
             print("Creato admin di default:", ADMIN_USER[0])
 
-        # membri
-        for name in NAMES:
-            if not db.query(Member).filter_by(name=name).first():
-                db.add(Member(name=name))
+        # membri (una sola query per sapere quali esistono già)
+        existing = {n for (n,) in db.query(Member.name)}
+        db.add_all([Member(name=name) for name in NAMES if name not in existing])
         db.commit()
 
         # regole
@@ -124,19 +124,14 @@ def main():
         if not admin:
             raise RuntimeError("Nessun utente presente: crea prima un utente admin.")
 
-        name_to_id = {m.name: m.id for m in db.query(Member).all()}
-        inserted = 0
-        for nome, motivo, n in MOVEMENTS:
-            mid = name_to_id.get(nome)
-            if not mid:
-                print("ATTENZIONE: nome non trovato, salto:", nome)
-                continue
-            mv = Movement(member_id=mid, user_id=admin.id, kind="debit",
-                          crocette=int(n), casse=0, note=motivo)
-            db.add(mv)
-            inserted += 1
+        # insert in blocco e idempotente: rilanciando lo script i movimenti già importati vengono saltati
+        rows = [{"member": nome, "note": motivo, "crocette": n, "kind": "debit"} for nome, motivo, n in MOVEMENTS]
+        plan = plan_import(db, rows, admin.id, source="data_import", rule_for=lambda row: None)
+        for row in plan.unknown_members:
+            print("ATTENZIONE: nome non trovato, salto:", row["member"])
+        inserted = apply_import(db, plan)
         db.commit()
-        print(f"Inseriti {inserted} movimenti.")
+        print(f"Inseriti {inserted} movimenti ({len(plan.duplicates)} già presenti).")
 
         # Copia PDF calendario se presente accanto allo script
         src_pdf = os.path.join(os.path.dirname(__file__), "Calendario_Paste_2025_2026.pdf")
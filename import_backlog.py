@@ -1,9 +1,10 @@
 import os
-from datetime import datetime
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
-from app.models import Member, Movement, User, Rule
+from app.models import User, Rule
 from app.database import Base
+from app.migrations import upgrade
+from app.importer import plan_import, apply_import, print_plan, default_rule_resolver
 from dotenv import load_dotenv
 
 # Carica le variabili d'ambiente dal file .env
@@ -78,6 +79,7 @@ BACKLOG_STUFF = [
 ]
 
 def import_data():
+    upgrade(engine)
     db = SessionLocal()
     try:
         # Recupera l'admin per associare i movimenti
@@ -86,57 +88,26 @@ def import_data():
             print("ERRORE: Nessun utente admin trovato nel database.")
             return
 
-        # Mappa nomi -> id (aggiungiamo alias manuali se necessario)
-        members = db.query(Member).all()
-        name_to_id = {m.name.lower(): m.id for m in members}
-        # Alias comuni
-        name_to_id["pie"] = name_to_id.get("pietro")
-
-        # Recupera tutte le regole per provare a fare un match
-        rules = db.query(Rule).all()
-        
-        # Cerchiamo o creiamo una regola generica per i casi non mappati
+        # Cerchiamo una regola generica per i casi non mappati
         generic_rule = db.query(Rule).filter(Rule.title.ilike("%altro%")).first()
         if not generic_rule:
              # Se non esiste, cerchiamo di usarne una generica o la creiamo se admin vuole
              generic_rule = db.query(Rule).filter(Rule.title.ilike("%sanzioni generale%")).first()
 
-        inserted = 0
-        for name, note, qty, kind in BACKLOG_STUFF:
-            mid = name_to_id.get(name.lower())
-            if not mid:
-                print(f"ATTENZIONE: Giocatore '{name}' non trovato, salto riga.")
-                continue
-            
-            # Prova a matchare la regola
-            matched_rule = None
-            note_lower = note.lower()
-            for r in rules:
-                if r.title.lower() in note_lower or note_lower in r.title.lower():
-                    matched_rule = r
-                    break
-            
-            # Se non trovo match, uso la regola generica
-            rid = matched_rule.id if matched_rule else (generic_rule.id if generic_rule else None)
-            
-            mv = Movement(
-                member_id=mid,
-                user_id=admin.id,
-                kind=kind, # "debit" o "credit"
-                crocette=int(qty),
-                casse=0,
-                note=note,
-                rule_id=rid,
-                created_at=datetime.utcnow()
-            )
-            db.add(mv)
-            inserted += 1
-            rule_name = matched_rule.title if matched_rule else (generic_rule.title if generic_rule else "Nessuna")
-            print(f"Pronto: {name} - {note} ({qty} {kind}) -> Regola: {rule_name}")
+        # Regola più simile alla nota (indice costruito una volta sola); se non c'è match uso la generica
+        rule_for = default_rule_resolver(db, fallback_id=generic_rule.id if generic_rule else None)
+
+        # Nomi risolti in blocco (alias "pie" compreso), righe già importate saltate
+        rows = [{"member": name, "note": note, "crocette": qty, "kind": kind}
+                for name, note, qty, kind in BACKLOG_STUFF]
+        plan = plan_import(db, rows, admin.id, source="import_backlog", rule_for=rule_for)
+        print_plan(plan)
+        inserted = len(plan.inserts)
 
         if inserted > 0:
             confirm = input(f"\nStai per inserire {inserted} nuovi movimenti nel database online. Confermi? (s/n): ")
             if confirm.lower() == 's':
+                apply_import(db, plan)
                 db.commit()
                 print(f"SUCCESSO: {inserted} movimenti inseriti correttamente.")
             else:
@@ -0,0 +1,13 @@
+// CSS purgato per build_assets.py: solo le classi usate nei template e negli script.
+/** @type {import('tailwindcss').Config} */
+module.exports = {
+  content: ["./app/templates/**/*.html", "./app/static/*.js"],
+  // classi aggiunte/tolte da live.js sulle card dei saldi: restano anche se un giorno venissero composte a runtime
+  safelist: [
+    "hidden", "ring-1", "ring-red-500/50", "bg-red-900/10", "bg-red-900/30",
+    "border-green-500", "bg-green-900/10", "border-red-500", "border-neutral-600",
+    "text-green-400", "text-red-400",
+  ],
+  theme: { extend: {} },
+  plugins: [],
+};